@@ -0,0 +1,162 @@
+import hashlib
+import io
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from rolling_features import RollingFeatures, node_features, FEATURE_WINDOWS
+from sample_store import SampleRing
+
+REMOTE_POLL_INTERVAL = 1.0  # seconds between delta polls of a remote node agent
+REMOTE_TIMEOUT = 5  # seconds
+
+
+class RemoteNodeAgent:
+    """
+    Mirrors the sample store of the Metrics API running on another node.
+
+    Polls its /metrics?since=<seq> in .npy format and appends only the new
+    samples into a local store and rolling feature trackers, exactly like
+    the tail reader does for this host's PCM.
+    """
+
+    def __init__(self, node: str, url: str):
+        self.node = node
+        self.url = url.rstrip("/")
+        self.cache = {"store": SampleRing([]), "features": {w: RollingFeatures([], w) for w in FEATURE_WINDOWS}}
+        self.remote_seq = None
+        self.last_error = None
+        self.stopped = False
+
+    def _reset(self, columns: list[str]):
+        self.cache["store"] = SampleRing(columns, start_seq=self.cache["store"].seq)
+        self.cache["features"] = {w: RollingFeatures(columns, w) for w in FEATURE_WINDOWS}
+
+    def poll(self) -> int:
+        params = {"format": "npy"}
+        if self.remote_seq is not None:
+            params["since"] = self.remote_seq
+        url = f"{self.url}/metrics?{urllib.parse.urlencode(params)}"
+        with urllib.request.urlopen(url, timeout=REMOTE_TIMEOUT) as response:
+            remote_seq = int(response.headers.get("X-Metrics-Seq", 0))
+            samples = np.load(io.BytesIO(response.read()), allow_pickle=False)
+
+        if self.remote_seq is not None and remote_seq < self.remote_seq:
+            # Remote agent restarted: start over with a full fetch
+            self.remote_seq = None
+            return 0
+        if not len(samples):
+            return 0
+        # Advance by the rows actually received, never past them
+        self.remote_seq = int(samples["Seq"][-1])
+
+        columns = list(samples.dtype.names[2:])  # Seq, Timestamp, then metric columns
+        if columns != self.cache["store"].columns:
+            self._reset(columns)
+        values = np.column_stack([samples[c] for c in columns])
+        for ts, row in zip(samples["Timestamp"], values):
+            self.cache["store"].append(ts, row)
+            for tracker in self.cache["features"].values():
+                tracker.append(row)
+        return len(samples)
+
+    def stop(self):
+        """Ends the polling loop (the node left the topology)."""
+        self.stopped = True
+
+    def run(self, interval: float = REMOTE_POLL_INTERVAL):
+        while not self.stopped:
+            try:
+                self.poll()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"[aggregator] Error polling {self.node} at {self.url}: {e}")
+                self.last_error = str(e)
+            time.sleep(interval)
+
+
+class NodeAggregator:
+    """
+    One indexed view over every node in the topology.
+
+    Local nodes are a core subset of this host's store; remote nodes are
+    mirrored by a RemoteNodeAgent each. Features are served per node, so
+    their cost scales with the number of nodes asked for.
+    """
+
+    def __init__(self, topology: dict[str, dict], local_cache: dict):
+        self.local_cache = local_cache
+        self.topology = {}
+        self.sources = {}
+        self.agents = {}
+        self.topology_version = 0  # Bumped on every switch, part of version()
+        self.topology_etag = None  # Content hash, stable across restarts, sent to clients as X-Topology-Version
+        self.pool = None
+        self.set_topology(topology)
+
+    def set_topology(self, topology: dict[str, dict]):
+        """
+        Switches to a new node -> core-set topology (e.g. topology.json was edited).
+        Agents of remote nodes whose URL is unchanged keep their mirrored samples.
+        """
+        sources, agents = {}, {}
+        for node, spec in topology.items():
+            if spec.get("url"):
+                agent = self.agents.get(node)
+                if agent is None or agent.url != spec["url"].rstrip("/"):
+                    agent = RemoteNodeAgent(node, spec["url"])
+                    threading.Thread(target=agent.run, daemon=True).start()
+                agents[node] = agent
+                sources[node] = agent.cache
+            else:
+                sources[node] = self.local_cache
+        for node, agent in self.agents.items():
+            if agents.get(node) is not agent:
+                agent.stop()
+        old_pool = self.pool
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(topology)))
+        self.sources, self.agents, self.topology = sources, agents, topology
+        self.topology_version += 1
+        self.topology_etag = hashlib.sha1(json.dumps(topology, sort_keys=True).encode()).hexdigest()[:16]
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+
+    def node_features(self, node: str, window: int) -> dict[str, float]:
+        tracker = self.sources[node]["features"].get(window)
+        if tracker is None:
+            raise KeyError(window)
+        return node_features(tracker, self.topology[node]["cores"])
+
+    def features(self, window: int, nodes: list[str] = None) -> dict[str, dict[str, float]]:
+        """{node: {feature_name: value}} for the given nodes (all by default), computed in parallel."""
+        nodes = list(self.topology) if nodes is None else nodes
+        results = self.pool.map(lambda node: self.node_features(node, window), nodes)
+        return dict(zip(nodes, results))
+
+    def samples(self, nodes: list[str] = None) -> int:
+        """Smallest number of buffered samples among the given nodes."""
+        nodes = list(self.topology) if nodes is None else nodes
+        return min(len(self.sources[node]["store"]) for node in nodes)
+
+    def version(self) -> tuple:
+        """Changes whenever the topology is replaced or any node's store gets a new sample or is replaced (header change)."""
+        return (self.topology_version,) + tuple((id(source["store"]), source["store"].seq) for source in self.sources.values())
+
+    def describe(self) -> dict[str, dict]:
+        info = {}
+        for node, spec in self.topology.items():
+            store = self.sources[node]["store"]
+            agent = self.agents.get(node)
+            info[node] = {
+                "cores": spec["cores"],
+                "source": agent.url if agent else "local",
+                "seq": store.seq,
+                "samples": len(store),
+                "error": agent.last_error if agent else None,
+            }
+        return info
@@ -1,23 +1,217 @@
-from flask import Flask, jsonify, Response
-from pcm_reader import init_metrics_updater, metrics_to_csv, BUFFER_PATH
+import json
+import os
+import threading
+import time
+from flask import Flask, jsonify, Response, request, stream_with_context
+from pcm_reader import init_metrics_updater, init_shared_follower, metrics_to_csv, metrics_to_npy, metrics_to_records, wait_for_samples, shared_cache, RAW_PATH, NPY_MIMETYPE
+from pcm_sampler import init_pcm_sampler
+from pcm_archive import open_sample_archive, range_to_csv, range_to_npy
+from sample_store import SHARED_STORE_ENV
+from rolling_features import FEATURE_WINDOWS
+from topology import load_topology, TOPOLOGY_PATH
+from aggregator import NodeAggregator
+from serving import RequestStats, ResponseCache
 
 app = Flask(__name__)
-cache = init_metrics_updater(BUFFER_PATH)
+# "sampler": run PCM as a child process and read its stdout (pcm_sampler.py)
+# "tail": follow the raw CSV written by pcm_monitoring.sh
+METRICS_SOURCE = os.environ.get("METRICS_SOURCE", "tail")
+# Parsed samples are also persisted to a memory-mapped archive for /metrics/range (see open_sample_archive)
+archive = open_sample_archive()
+# Set by gunicorn.conf.py: a separate reader process publishes the samples in shared memory
+# and every worker mirrors them; otherwise (development server) this process reads them itself
+SHARED_STORE = os.environ.get(SHARED_STORE_ENV)
+follower = None
+sampler = None
+if SHARED_STORE:
+    follower = init_shared_follower(SHARED_STORE)
+    cache = follower.cache
+elif METRICS_SOURCE == "sampler":
+    cache = shared_cache
+    sampler = init_pcm_sampler(cache, archive)
+else:
+    cache = init_metrics_updater(RAW_PATH, archive)
+aggregator = NodeAggregator(load_topology(), cache)
+topology_state = {"mtime": os.path.getmtime(TOPOLOGY_PATH) if os.path.exists(TOPOLOGY_PATH) else None}
+topology_lock = threading.Lock()
+STREAM_KEEPALIVE = 15  # seconds between SSE keep-alive comments when no samples arrive
+request_stats = RequestStats()
+request_stats.install(app)
+metrics_responses = ResponseCache()
+features_responses = ResponseCache()
+
+def refresh_topology():
+    """Reloads topology.json into the aggregator when it changed on disk since it was last read."""
+    mtime = os.path.getmtime(TOPOLOGY_PATH) if os.path.exists(TOPOLOGY_PATH) else None
+    if mtime == topology_state["mtime"]:
+        return
+    with topology_lock:
+        if mtime == topology_state["mtime"]:
+            return
+        topology_state["mtime"] = mtime
+        try:
+            aggregator.set_topology(load_topology())
+            print(f"[app] Reloaded topology: {list(aggregator.topology)}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[app] Keeping the current topology, cannot load {TOPOLOGY_PATH}: {e}")
+
+@app.before_request
+def sync_shared_store():
+    """Catches up with the reader process first, so this worker never serves an older seq than another one did."""
+    if follower is not None:
+        follower.sync()
+
+def sample_filters() -> tuple:
+    """Reads the optional ?since=<seq> and ?window=<seconds> query parameters."""
+    return request.args.get("since", type=int), request.args.get("window", type=float)
 
 @app.route("/metrics_list", methods=["GET"])
 def get_metrics():
     """Returns last parsed PCM metrics from buffer."""
-    return jsonify({"metrics": cache["metrics"]})
+    store = cache["store"]
+    since, window = sample_filters()
+    metrics, seq = metrics_to_records(store, since, window)
+    return jsonify({"seq": seq, "metrics": metrics})
 
 @app.route("/metrics", methods=["GET"])
 def get_metrics_csv():
-    csv_data = metrics_to_csv(cache["metrics"])
-    return Response(csv_data, mimetype="text/csv")
+    """
+    Returns the buffered PCM metrics as CSV (default) or as binary .npy when the
+    client asks for it with `Accept: application/x-npy` or `?format=npy`.
+
+    `?since=<seq>` returns only samples newer than that sequence number and
+    `?window=<seconds>` only the most recent seconds. The sequence number of
+    the newest sample, read together with the rows, is sent in the X-Metrics-Seq header.
+    """
+    store = cache["store"]
+    since, window = sample_filters()
+
+    def build(serialise):
+        body, seq = serialise(store, since, window)
+        return body, (id(store), seq)
+
+    # Looked up at the current seq, but filed and labelled with the seq the body was built at
+    version = (id(store), store.seq)
+    if request.args.get("format") == "npy" or request.accept_mimetypes.best_match(["text/csv", NPY_MIMETYPE]) == NPY_MIMETYPE:
+        body, (_, seq) = metrics_responses.get(version, ("npy", since, window), lambda: build(metrics_to_npy))
+        return Response(body, mimetype=NPY_MIMETYPE, headers={"X-Metrics-Seq": str(seq)})
+    csv_data, (_, seq) = metrics_responses.get(version, ("csv", since, window), lambda: build(metrics_to_csv))
+    return Response(csv_data, mimetype="text/csv", headers={"X-Metrics-Seq": str(seq)})
+
+@app.route("/metrics/range", methods=["GET"])
+def get_metrics_range():
+    """
+    Returns archived PCM samples with `from` <= timestamp <= `to` (epoch seconds,
+    `to` defaults to now) as .npy (Timestamp + float32 metric columns) or CSV,
+    negotiated like /metrics. Served from the on-disk archive, so the range can
+    reach far beyond the in-memory window.
+    """
+    if archive is None:
+        return jsonify({"error": "Sample archive is disabled"}), 404
+    if follower is not None:
+        archive.refresh()  # Written by the reader process
+    start = request.args.get("from", type=float)
+    end = request.args.get("to", default=time.time(), type=float)
+    if start is None or end < start:
+        return jsonify({"error": "Expected ?from=<epoch seconds>[&to=<epoch seconds>] with from <= to"}), 400
+    parts = archive.range(start, end)
+    headers = {"X-Metrics-Samples": str(sum(len(ts) for _, ts, _ in parts))}
+    if request.args.get("format") == "npy" or request.accept_mimetypes.best_match(["text/csv", NPY_MIMETYPE]) == NPY_MIMETYPE:
+        return Response(range_to_npy(parts), mimetype=NPY_MIMETYPE, headers=headers)
+    return Response(range_to_csv(parts), mimetype="text/csv", headers=headers)
+
+@app.route("/stream", methods=["GET"])
+def stream_metrics():
+    """
+    Server-sent events stream of parsed PCM samples.
+
+    A "columns" event (JSON list of metric columns) is sent first and whenever
+    the PCM header changes, followed by one "sample" event per sample:
+    {"seq", "timestamp", "values"}. The retained window is replayed on connect;
+    `?since=<seq>` replays only newer samples (e.g. when reconnecting).
+    """
+    since = request.args.get("since", type=int)
+
+    def events():
+        last_seq = since if since is not None and since <= cache["store"].seq else None
+        columns = None
+        while True:
+            store = cache["store"]
+            if store.columns != columns:
+                columns = store.columns
+                yield f"event: columns\ndata: {json.dumps(columns)}\n\n"
+            seqs, timestamps, values, _ = store.select(since=last_seq)
+            for seq, ts, row in zip(seqs.tolist(), timestamps.tolist(), values.tolist()):
+                payload = json.dumps({"seq": seq, "timestamp": ts, "values": row})
+                yield f"event: sample\nid: {seq}\ndata: {payload}\n\n"
+            if len(seqs):
+                last_seq = int(seqs[-1])
+            elif last_seq is None:
+                last_seq = store.seq
+            if not wait_for_samples(cache, last_seq, timeout=STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/features", methods=["GET"])
+def get_features():
+    """
+    Returns rolling mean/std/p95 features per node, keyed by the Predictor's
+    feature names (e.g. "std_Core3_IPC"). `?window=<samples>` selects the
+    rolling window (default 10), `?node=<name>` restricts the answer to one node.
+    The topology it was answered with is identified by the X-Topology-Version header.
+    """
+    refresh_topology()
+    headers = {"X-Topology-Version": aggregator.topology_etag}
+    window = request.args.get("window", default=FEATURE_WINDOWS[0], type=int)
+    if window not in FEATURE_WINDOWS:
+        return jsonify({"error": f"Unsupported window {window}", "supported_windows": list(FEATURE_WINDOWS)}), 400
+
+    node = request.args.get("node")
+    if node is not None and node not in aggregator.topology:
+        return jsonify({"error": f"Unknown node {node}", "nodes": list(aggregator.topology)}), 404, headers
+    nodes = [node] if node is not None else None
+
+    def build():
+        version, seq = aggregator.version(), cache["store"].seq
+        body = {"seq": seq, "window": window, "samples": aggregator.samples(nodes), "features": aggregator.features(window, nodes)}
+        # Node stores are read one after another, so only a body no sample raced with is cacheable
+        return body, version if aggregator.version() == version else None
+
+    body, _ = features_responses.get(aggregator.version(), (window, node), build)
+    return jsonify(body), 200, headers
+
+@app.route("/nodes", methods=["GET"])
+def get_nodes():
+    """
+    Returns the node -> core-set topology and the state of each node's samples,
+    with the topology's content hash in the X-Topology-Version header.
+    """
+    refresh_topology()
+    return jsonify({"nodes": aggregator.describe()}), 200, {"X-Topology-Version": aggregator.topology_etag}
 
 @app.route("/health", methods=["GET"])
 def health():
     """Simple health check endpoint."""
-    return jsonify({"status": "Healthy", "metrics_count": len(cache["metrics"])})
+    status = {"status": "Healthy", "source": METRICS_SOURCE, "metrics_count": len(cache["store"]), "seq": cache["store"].seq}
+    if sampler is not None:
+        status["sampler"] = sampler.health()
+    if follower is not None:
+        status["reader"] = follower.ring.status()
+        status["worker_pid"] = os.getpid()
+    elif archive is not None:
+        status["archive"] = archive.describe()
+    return jsonify(status)
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """Request latency histograms per endpoint and response cache hit rates (of the worker that answers)."""
+    summary = request_stats.summary()
+    summary["worker_pid"] = os.getpid()
+    summary["response_cache"] = {"metrics": metrics_responses.summary(), "features": features_responses.summary()}
+    return jsonify(summary)
 
 if __name__ == "__main__":
+    # Development server; in production run `gunicorn -c gunicorn.conf.py app:app`
     app.run(host="0.0.0.0", port=30090, threaded=True)
@@ -0,0 +1,58 @@
+# Production serving for the Metrics API: gunicorn -c gunicorn.conf.py app:app
+#
+# Pre-forked workers, each with a thread pool. Before forking them the master
+# creates a SharedSampleRing (shared memory) and starts one reader process
+# (reader_process.py) that tails PCM's CSV, or runs PCM, and publishes every
+# sample into it. Each worker mirrors the ring into its own store and feature
+# trackers (pcm_reader.SharedStoreFollower), so /metrics serialisation and
+# /features for different pollers run in parallel processes instead of under
+# one GIL, while there is still exactly one reader and one sequence of seqs.
+# Remote node agents (topology nodes with a "url") are polled by every worker.
+import os
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+READER_RESTART_DELAY = 5  # seconds before restarting a reader process that exited
+
+bind = f"0.0.0.0:{os.environ.get('METRICS_PORT', '30090')}"
+workers = int(os.environ.get("METRICS_WORKERS", "4"))
+worker_class = "gthread"
+# Each open /stream (SSE) subscriber holds one thread for as long as it is connected
+threads = int(os.environ.get("METRICS_THREADS", "8"))
+preload_app = False  # Every worker imports app.py itself and attaches to the shared ring
+timeout = 60
+keepalive = 5
+accesslog = None
+
+
+def start_reader(name: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.join(HERE, "reader_process.py"), name])
+
+
+def supervise_reader(server):
+    while True:
+        code = server.reader.wait()
+        if server.sample_ring is None:
+            return  # Shutting down
+        server.log.warning(f"Reader process exited with code {code}, restarting in {READER_RESTART_DELAY}s")
+        time.sleep(READER_RESTART_DELAY)
+        server.reader = start_reader(server.sample_ring.name)
+
+
+def when_ready(server):
+    """Creates the shared sample ring and starts the reader process once bound, before any worker is forked."""
+    sys.path.insert(0, HERE)
+    from sample_store import SharedSampleRing, SHARED_STORE_ENV
+    server.sample_ring = SharedSampleRing()
+    os.environ[SHARED_STORE_ENV] = server.sample_ring.name  # Inherited by the workers
+    server.reader = start_reader(server.sample_ring.name)
+    threading.Thread(target=supervise_reader, args=(server,), daemon=True).start()
+
+
+def on_exit(server):
+    ring, server.sample_ring = server.sample_ring, None
+    server.reader.terminate()
+    ring.close()
@@ -0,0 +1,250 @@
+import csv
+import io
+import json
+import os
+import threading
+from datetime import datetime
+import numpy as np
+
+ARCHIVE_DIR = "/opt/pcm_metrics/archive"
+ARCHIVE_INITIAL_ROWS = 3600  # Rows preallocated per segment (one hour at 1 Hz), doubled when full
+ARCHIVE_FLUSH_EVERY = 60  # Samples between msync of the mapped files
+
+
+def writable_dir(path: str) -> bool:
+    """True if `path` is, or could be created as, a directory this process can write to."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK)
+
+
+class ArchiveSegment:
+    """
+    Samples stored under one PCM header, as two memory-mapped files:
+
+        timestamps.f64  one float64 epoch timestamp per row (the time index)
+        values.f32      rows x columns float32 metric values
+
+    plus columns.json. Rows are fixed-width, so row i is at a known offset
+    and a time range is two binary searches on the timestamp index. Unused
+    rows have a NaN timestamp, which is how the row count is recovered when
+    an existing segment is reopened.
+    """
+
+    def __init__(self, path: str, columns: list[str] = None, capacity: int = ARCHIVE_INITIAL_ROWS):
+        self.path = path
+        if columns is None:
+            with open(os.path.join(path, "columns.json")) as f:
+                self.columns = json.load(f)
+            capacity = os.path.getsize(os.path.join(path, "timestamps.f64")) // 8
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.columns = list(columns)
+            with open(os.path.join(path, "columns.json"), "w") as f:
+                json.dump(self.columns, f)
+        self._map(capacity)
+        self.count = int(np.searchsorted(self.timestamps, np.nan))  # NaN sorts after every timestamp
+
+    @property
+    def start(self) -> float:
+        return float(self.timestamps[0]) if self.count else np.nan
+
+    @property
+    def end(self) -> float:
+        return float(self.timestamps[self.count - 1]) if self.count else np.nan
+
+    def _map(self, capacity: int):
+        """(Re)maps both files at `capacity` rows, extending them with NaN-timestamp rows if needed."""
+        ts_path = os.path.join(self.path, "timestamps.f64")
+        values_path = os.path.join(self.path, "values.f32")
+        existing = os.path.getsize(ts_path) // 8 if os.path.exists(ts_path) else 0
+        for file_path, row_bytes in ((ts_path, 8), (values_path, 4 * len(self.columns))):
+            with open(file_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self.timestamps = np.memmap(ts_path, dtype=np.float64, mode="r+", shape=(capacity,))
+        self.values = np.memmap(values_path, dtype=np.float32, mode="r+", shape=(capacity, len(self.columns)))
+        self.timestamps[existing:] = np.nan
+        self.capacity = capacity
+
+    def append(self, timestamp: float, values) -> None:
+        if self.count == self.capacity:
+            self.flush()
+            self._map(self.capacity * 2)
+        self.values[self.count] = values
+        self.timestamps[self.count] = timestamp  # Written last: a row with a timestamp is complete
+        self.count += 1
+
+    def range(self, start: float, end: float) -> tuple[np.ndarray, np.ndarray]:
+        """Zero-copy (timestamps, values) views of the rows with start <= timestamp <= end."""
+        count = self.count
+        lo = np.searchsorted(self.timestamps[:count], start, side="left")
+        hi = np.searchsorted(self.timestamps[:count], end, side="right")
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+    def flush(self):
+        self.timestamps.flush()
+        self.values.flush()
+
+    def reload(self):
+        """Picks up rows (and growth) written by another process into this segment."""
+        capacity = os.path.getsize(os.path.join(self.path, "timestamps.f64")) // 8
+        if capacity != self.capacity:
+            self._map(capacity)
+        # Rows end at the first NaN (unused) or zero (file grown but not yet NaN-filled) timestamp
+        written = self.timestamps[self.count:] > 0
+        self.count += int(np.argmin(written)) if not written.all() else len(written)
+
+
+class SampleArchive:
+    """
+    Append-only on-disk history of every parsed PCM sample.
+
+    A new segment (sub-directory named after its first timestamp) starts
+    whenever the kept columns change; on startup the newest segment is
+    reopened and appended to if its columns still match. Samples that are
+    not newer than the last archived one (e.g. rows the tail reader
+    backfills again after a restart) are skipped, so the time index stays
+    sorted.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.segments = []
+        for name in sorted(os.listdir(directory), key=lambda n: float(n) if n.replace(".", "", 1).isdigit() else -1):
+            try:
+                self.segments.append(ArchiveSegment(os.path.join(directory, name)))
+            except (OSError, ValueError) as e:
+                print(f"[pcm_archive] Skipping unreadable segment {name}: {e}")
+        self.current = None
+        self.pending = None  # Columns for the next segment, created on its first sample
+        self.last_timestamp = max((s.end for s in self.segments if s.count), default=-np.inf)
+        self.since_flush = 0
+
+    def refresh(self):
+        """
+        Catches up with segments and rows appended by another process, for
+        server workers reading the archive the reader process writes.
+        """
+        with self.lock:
+            known = {s.path for s in self.segments}
+            for segment in self.segments:
+                segment.reload()
+            for name in sorted(os.listdir(self.directory), key=lambda n: float(n) if n.replace(".", "", 1).isdigit() else -1):
+                path = os.path.join(self.directory, name)
+                if path in known:
+                    continue
+                try:
+                    self.segments.append(ArchiveSegment(path))
+                except (OSError, ValueError):
+                    pass  # Still being created, picked up on a later refresh
+            self.last_timestamp = max((s.end for s in self.segments if s.count), default=-np.inf)
+
+    def set_columns(self, columns: list[str]):
+        with self.lock:
+            if self.current is not None and self.current.columns == list(columns):
+                return
+            latest = self.segments[-1] if self.segments else None
+            if self.current is None and latest is not None and latest.columns == list(columns):
+                self.current = latest
+                return
+            if self.current is not None:
+                self.current.flush()
+            self.current, self.pending = None, list(columns)
+
+    def append(self, timestamp: float, values) -> bool:
+        """Archives one sample. Returns False when it was skipped as not newer than the last one."""
+        with self.lock:
+            if not timestamp > self.last_timestamp:
+                return False
+            if self.current is None:
+                if self.pending is None:
+                    return False
+                self.current = ArchiveSegment(os.path.join(self.directory, f"{timestamp:.3f}"), self.pending)
+                self.segments.append(self.current)
+                self.pending = None
+            self.current.append(timestamp, values)
+            self.last_timestamp = timestamp
+            self.since_flush += 1
+            if self.since_flush >= ARCHIVE_FLUSH_EVERY:
+                self.current.flush()
+                self.since_flush = 0
+            return True
+
+    def range(self, start: float, end: float) -> list[tuple[list[str], np.ndarray, np.ndarray]]:
+        """(columns, timestamps, values) zero-copy slices of every segment overlapping [start, end], oldest first."""
+        with self.lock:
+            segments = [s for s in self.segments if s.count and s.end >= start and s.start <= end]
+        result = []
+        for segment in segments:
+            timestamps, values = segment.range(start, end)
+            if len(timestamps):
+                result.append((segment.columns, timestamps, values))
+        return result
+
+    def describe(self) -> dict:
+        with self.lock:
+            return {
+                "directory": self.directory,
+                "segments": len(self.segments),
+                "samples": sum(s.count for s in self.segments),
+                "start": next((s.start for s in self.segments if s.count), None),
+                "end": self.last_timestamp if np.isfinite(self.last_timestamp) else None,
+            }
+
+
+def open_sample_archive() -> SampleArchive:
+    """
+    The SampleArchive configured by METRICS_ARCHIVE_DIR (an empty value disables it), or None.
+    Without the variable ARCHIVE_DIR is used, but only when writable: it lives under
+    /opt/pcm_metrics, which the pod mounts read-only.
+    """
+    directory = os.environ.get("METRICS_ARCHIVE_DIR")
+    if directory is None:
+        directory = ARCHIVE_DIR if writable_dir(ARCHIVE_DIR) else ""
+        if not directory:
+            print(f"[pcm_archive] Sample archive disabled, {ARCHIVE_DIR} is not writable (set METRICS_ARCHIVE_DIR to enable it)")
+    if not directory:
+        return None
+    try:
+        return SampleArchive(directory)
+    except OSError as e:
+        print(f"[pcm_archive] Sample archive disabled, cannot use {directory}: {e}")
+        return None
+
+
+def range_to_npy(parts: list[tuple[list[str], np.ndarray, np.ndarray]]) -> bytes:
+    """
+    Serialises archive slices as one structured .npy array: "Timestamp" (float64)
+    followed by the union of the metric columns (float32, NaN where a segment lacks one).
+    """
+    columns = []
+    for part_columns, _, _ in parts:
+        columns += [c for c in part_columns if c not in columns]
+    dtype = np.dtype([("Timestamp", "<f8")] + [(name, "<f4") for name in columns])
+    table = np.empty(sum(len(ts) for _, ts, _ in parts), dtype=dtype)
+    row = 0
+    for part_columns, timestamps, values in parts:
+        n = len(timestamps)
+        table["Timestamp"][row:row + n] = timestamps
+        for name in columns:
+            table[name][row:row + n] = values[:, part_columns.index(name)] if name in part_columns else np.nan
+        row += n
+    output = io.BytesIO()
+    np.save(output, table, allow_pickle=False)
+    return output.getvalue()
+
+
+def range_to_csv(parts: list[tuple[list[str], np.ndarray, np.ndarray]]) -> str:
+    """Serialises archive slices as CSV with PCM-style Date/Time columns, one header block per segment."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for columns, timestamps, values in parts:
+        writer.writerow(["Date", "Time"] + columns)
+        for ts, row in zip(timestamps.tolist(), values.tolist()):
+            stamp = datetime.fromtimestamp(ts)
+            # float32 values, so 7 significant digits round-trip them without float64 noise
+            writer.writerow([stamp.strftime("%Y-%m-%d"), stamp.strftime("%H:%M:%S.%f")[:-3]] + [f"{v:.7g}" for v in row])
+    return output.getvalue()
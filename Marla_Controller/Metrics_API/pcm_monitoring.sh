@@ -7,16 +7,8 @@ cd "$METRICS_DIR"
 sudo modprobe msr
 # Start Intel PCM tool in background, logging to raw_metrics.csv
 # Sample interval = 1 second, output is CSV
+# The Metrics API follows raw_metrics.csv directly by byte offset (see pcm_reader.py),
+# so no intermediate buffer file is maintained here.
+# Alternatively, start the Metrics API with METRICS_SOURCE=sampler: it then runs PCM itself
+# (pcm_sampler.py), restarts it if it exits and caps raw_metrics.csv, and this script is not needed.
 sudo /home/george/Workspace/pcm/build/bin/pcm 1 -r -csv=raw_metrics.csv 1>&- 2>&- &
-
-# Maintain a 40-line buffer of latest data in buffer_metrics.csv
-while true; do
-    # Copy header (top 3 lines)
-    head -n 2 raw_metrics.csv > buffer_metrics_temp.csv
-    # Copy last 30 lines of actual data
-    tail -n 40 raw_metrics.csv >> buffer_metrics_temp.csv
-    # Atomically replace the old buffer
-    mv buffer_metrics_temp.csv buffer_metrics.csv
-    # Wait before repeating
-    sleep 2
-done &
\ No newline at end of file
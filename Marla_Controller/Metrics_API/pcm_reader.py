@@ -1,55 +1,33 @@
 import csv
+import os
 import threading
 import time
 import io
-import csv
+from datetime import datetime
+import numpy as np
+from sample_store import SampleRing, SharedSampleRing
+from rolling_features import RollingFeatures, FEATURE_WINDOWS
 
-BUFFER_PATH = "/opt/pcm_metrics/buffer_metrics.csv"
+RAW_PATH = "/opt/pcm_metrics/raw_metrics.csv"
+POLL_INTERVAL = 0.5  # seconds between offset checks (PCM samples every 1 s)
+BACKFILL_BYTES_PER_ROW = 4096  # Upper bound of a PCM row, used to seek near the tail on startup
+BACKFILL_ROWS = 40  # Samples parsed from existing history when the reader (re)opens the file
+FOLLOW_INTERVAL = 0.05  # seconds between checks of the shared sample ring by a server worker
 DESIRED_KEYWORDS = [
     "ipc", "l2miss", "l3miss", "read", "write", "c0res%", "c1res%", "c6res%"
 ]
 DOMAIN_FILTER = "core"
+NPY_MIMETYPE = "application/x-npy"  # Binary /metrics format: structured .npy, one float64 field per column
 
-shared_cache = {"metrics": []}
-
+shared_cache = {"store": SampleRing([]), "features": {w: RollingFeatures([], w) for w in FEATURE_WINDOWS}}
+new_samples = threading.Condition()  # Notified whenever the reader stores new samples
 
-def read_buffer_csv(buffer_path: str) -> list[list[str]]:
-    """Reads raw rows from buffer CSV (including headers)."""
-    with open(buffer_path, mode='r') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    return rows
 
-def metrics_to_csv(metrics: list[dict]) -> str:
+def build_column_plan(header_domain: list[str], header_metric: list[str]) -> tuple[list[int], list[str]]:
     """
-    Converts list of dicts (metrics) into CSV-formatted string.
+    Resolves the two PCM header rows into the indices of the columns we keep
+    and their final "<domain> - <metric>" names.
     """
-    if not metrics:
-        return ""
-
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=metrics[0].keys())
-    writer.writeheader()
-    writer.writerows(metrics)
-    return output.getvalue()
-
-def parse_csv_rows(rows: list[list[str]]) -> list[dict]:
-    """
-    Filters and parses rows from PCM based on core-domain and desired keywords.
-    Returns list of dicts for API response.
-    """
-    if len(rows) < 3:
-        #print("[pcm_reader] CSV file has fewer than 3 rows — skipping.") #DEBUG
-        return []
-
-    header_domain = rows[0]
-    header_metric = rows[1]
-    data_rows = rows[2:]
-
-    #print(f"[pcm_reader] Header domain columns: {len(header_domain)}") #DEBUG
-    #print(f"[pcm_reader] Header metric columns: {len(header_metric)}") #DEBUG
-
-    # Build final headers and indices to keep
     indices_to_keep = []
     final_headers = []
     for idx, (dom, met) in enumerate(zip(header_domain, header_metric)):
@@ -61,52 +39,299 @@ def parse_csv_rows(rows: list[list[str]]) -> list[dict]:
         elif any(kw in met_lower for kw in DESIRED_KEYWORDS) and DOMAIN_FILTER in dom_lower:
             indices_to_keep.append(idx)
             final_headers.append(f"{dom.strip()} - {met.strip()}")
-    
-    #print(f"[pcm_reader] Keeping {len(indices_to_keep)} columns: {final_headers[:5]}...") #DEBUG
-
-    # Parse selected data rows into dicts
-    result = []
-    for i,row in enumerate(data_rows):
-        if len(row) < max(indices_to_keep) + 1:
-            #print(f"[pcm_reader] Skipping row {i} with only {len(row)} columns.") #DEBUG
-            continue
-        filtered = [row[i] for i in indices_to_keep]
-        result.append(dict(zip(final_headers, filtered)))
-    #print(f"[pcm_reader] Parsed {len(result)} metrics from CSV.") #DEBUG
-    return result
-
-def metrics_to_csv(metrics: list[dict]) -> str:
+    return indices_to_keep, final_headers
+
+
+def parse_timestamp(date: str, time_of_day: str) -> float:
+    """Converts PCM's Date and Time fields into epoch seconds (local time, as PCM writes them)."""
+    return datetime.fromisoformat(f"{date.strip()} {time_of_day.strip()}").timestamp()
+
+
+def to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def metrics_to_records(store: SampleRing, since: int = None, window: float = None) -> tuple[list[dict], int]:
+    """
+    Converts the sample store into a list of dicts with the PCM Date/Time columns restored.
+    `since` and `window` restrict the result as in SampleRing.select().
+    Also returns the store's newest sequence number at the time of the read.
     """
-    Converts list of dicts (metrics) into CSV-formatted string.
+    seqs, timestamps, values, seq = store.select(since, window)
+    records = []
+    for row_seq, ts, row in zip(seqs.tolist(), timestamps.tolist(), values.tolist()):
+        stamp = datetime.fromtimestamp(ts)
+        record = {"Seq": row_seq, "Date": stamp.strftime("%Y-%m-%d"), "Time": stamp.strftime("%H:%M:%S.%f")[:-3]}
+        record.update(zip(store.columns, row))
+        records.append(record)
+    return records, seq
+
+
+def metrics_to_csv(store: SampleRing, since: int = None, window: float = None) -> tuple[str, int]:
     """
+    Converts the sample store into CSV-formatted string, with the newest sequence number it is current to.
+    """
+    metrics, seq = metrics_to_records(store, since, window)
     if not metrics:
-        return ""
+        return "", seq
 
     output = io.StringIO()
     writer = csv.DictWriter(output, fieldnames=metrics[0].keys())
     writer.writeheader()
     writer.writerows(metrics)
-    return output.getvalue()
+    return output.getvalue(), seq
+
+
+def metrics_to_npy(store: SampleRing, since: int = None, window: float = None) -> tuple[bytes, int]:
+    """
+    Serialises the sample store as a structured NumPy array (.npy bytes), with the
+    newest sequence number it is current to.
+    Fields are "Seq", "Timestamp" (epoch seconds) and then the metric columns.
+    """
+    seqs, timestamps, values, seq = store.select(since, window)
+    dtype = np.dtype([(name, "<f8") for name in ["Seq", "Timestamp"] + store.columns])
+    table = np.empty((len(timestamps), len(dtype.names)), dtype=np.float64)
+    table[:, 0] = seqs
+    table[:, 1] = timestamps
+    table[:, 2:] = values
+    output = io.BytesIO()
+    np.save(output, table.view(dtype).ravel(), allow_pickle=False)
+    return output.getvalue(), seq
+
+
+class PCMRowParser:
+    """
+    Turns PCM CSV rows into samples in the shared store and feature trackers.
+
+    The two PCM header rows are resolved into a column plan once and reused
+    until the header actually changes; data rows are then converted and
+    appended in place. Shared by the tail reader and the PCM sampler.
+    When a SampleArchive is given, every sample is also persisted to disk,
+    and when a SharedSampleRing is given, published to the server workers.
+    """
 
+    def __init__(self, cache: dict, archive=None, publisher: SharedSampleRing = None):
+        self.cache = cache
+        self.archive = archive
+        self.publisher = publisher
+        self.header = None          # (domain_row, metric_row) the plan was built from
+        self.time_indices = None    # Raw indices of PCM's Date and Time fields
+        self.value_indices = []     # Raw indices of the kept core metrics
+        self.min_len = 0
+        self.skipped_rows = 0       # Data rows that could not be parsed
 
-def periodic_buffer_refresh(buffer_path: str, cache: dict, interval: int = 5):
-    """Periodically refreshes shared_cache with latest metrics."""
-    while True:
+    def set_header(self, header_domain: list[str], header_metric: list[str]):
+        header = (tuple(header_domain), tuple(header_metric))
+        if header == self.header:
+            return
+        self.header = header
+        indices_to_keep, final_headers = build_column_plan(header_domain, header_metric)
+        columns = dict(zip(final_headers, indices_to_keep))
+        date_idx, time_idx = columns.pop("Date", None), columns.pop("Time", None)
+        self.time_indices = (date_idx, time_idx) if date_idx is not None and time_idx is not None else None
+        self.value_indices = list(columns.values())
+        self.min_len = max(indices_to_keep) + 1 if indices_to_keep else 0
+        # Samples stored under the old header no longer line up with the new columns.
+        # Sequence numbers keep counting so delta clients notice the reset.
+        previous = self.cache.get("store")
+        self.cache["store"] = SampleRing(list(columns.keys()), start_seq=previous.seq if previous else 0)
+        self.cache["features"] = {w: RollingFeatures(list(columns.keys()), w) for w in FEATURE_WINDOWS}
+        if self.archive is not None:
+            self.archive.set_columns(list(columns.keys()))
+        if self.publisher is not None:
+            self.publisher.set_columns(list(columns.keys()))
+        print(f"[pcm_reader] Header changed, keeping {len(self.value_indices)} metric columns.")
+
+    def parse_row(self, row: list[str]) -> bool:
+        """Stores one PCM data row. Returns False when the row was skipped."""
+        if self.time_indices is None or len(row) < self.min_len:
+            self.skipped_rows += 1
+            return False
+        try:
+            timestamp = parse_timestamp(row[self.time_indices[0]], row[self.time_indices[1]])
+        except ValueError:
+            self.skipped_rows += 1
+            return False
+        values = [to_float(row[i]) for i in self.value_indices]
+        self.cache["store"].append(timestamp, values)
+        for tracker in self.cache["features"].values():
+            tracker.append(values)
+        if self.publisher is not None:
+            self.publisher.append(timestamp, values)
+        if self.archive is not None:
+            try:
+                self.archive.append(timestamp, values)
+            except OSError as e:
+                print(f"[pcm_reader] Disabling the sample archive after a write error: {e}")
+                self.archive = None
+        return True
+
+
+class PCMTailReader:
+    """
+    Follows PCM's raw CSV by byte offset and parses only newly appended rows.
+
+    Truncation (file shrinks below our offset) and rotation (inode changes)
+    restart reading from the top; the header column plan is only rebuilt
+    when the header rows actually differ.
+    """
+
+    def __init__(self, raw_path: str, cache: dict, archive=None, publisher: SharedSampleRing = None):
+        self.raw_path = raw_path
+        self.parser = PCMRowParser(cache, archive, publisher)
+        self.inode = None
+        self.offset = 0
+        self.partial = b""
+        self.header_rows = []       # Header rows collected since the last (re)open
+
+    def _reset(self, inode):
+        self.inode = inode
+        self.offset = 0
+        self.partial = b""
+        self.header_rows = []
+
+    def _backfill_offset(self, f, header_end: int, size: int) -> int:
+        """Returns an offset near the end of the file so startup does not parse hours of history."""
+        start = size - BACKFILL_ROWS * BACKFILL_BYTES_PER_ROW
+        if start <= header_end:
+            return header_end
+        f.seek(start - 1)
+        # Skip to the beginning of the next full line
+        if f.read(1) != b"\n":
+            f.readline()
+        return f.tell()
+
+    def _parse_lines(self, lines: list[bytes]) -> int:
+        new_rows = 0
+        for row in csv.reader(line.decode("utf-8", errors="replace") for line in lines):
+            if not row:
+                continue
+            if len(self.header_rows) < 2:
+                self.header_rows.append(row)
+                if len(self.header_rows) == 2:
+                    self.parser.set_header(*self.header_rows)
+                continue
+            new_rows += self.parser.parse_row(row)
+        return new_rows
+
+    def poll(self) -> int:
+        """Reads whatever PCM appended since the last call. Returns the number of new rows."""
         try:
-            raw_rows = read_buffer_csv(buffer_path)
-            #print(f"[pcm_reader] Read {len(raw_rows)} rows from buffer.") #DEBUG
-            parsed = parse_csv_rows(raw_rows)
-            #print(f"[pcm_reader] Parsed {len(parsed)} metrics.") #DEBUG
-            cache["metrics"] = parsed
-            print(f"[pcm_reader {time.strftime('%Y-%m-%d %H:%M:%S')}] Updated cache with {len(parsed)} metrics.")
-        except Exception as e:
-            print(f"[pcm_reader] Error reading buffer: {e}")
-            cache["metrics"] = []
-        time.sleep(interval)
-
-
-def init_metrics_updater(buffer_path: str) -> dict:
+            st = os.stat(self.raw_path)
+        except FileNotFoundError:
+            return 0
+
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self._reset(st.st_ino)
+        if st.st_size == self.offset:
+            return 0
+
+        with open(self.raw_path, "rb") as f:
+            f.seek(self.offset)
+            if self.offset == 0:
+                # Fresh file: consume the two header rows, then jump close to the tail
+                self.header_rows = []
+                for _ in range(2):
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        return 0  # Header not fully written yet, retry on next poll
+                    self._parse_lines([line])
+                self.offset = self._backfill_offset(f, f.tell(), st.st_size)
+                f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+
+        self.offset += len(chunk)
+        data = self.partial + chunk
+        lines = data.split(b"\n")
+        self.partial = lines.pop()  # Incomplete last line (PCM is still writing it)
+        new_rows = self._parse_lines(lines)
+        if new_rows:
+            notify_new_samples()
+        return new_rows
+
+    def run(self, interval: float = POLL_INTERVAL):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[pcm_reader] Error tailing {self.raw_path}: {e}")
+                self._reset(None)
+            time.sleep(interval)
+
+
+class SharedStoreFollower:
+    """
+    Mirrors the SharedSampleRing written by the reader process into this
+    server worker's own store and feature trackers, the way RemoteNodeAgent
+    mirrors another node's Metrics API.
+
+    A background thread follows the ring (waking /stream subscribers), and
+    sync() also runs before every request, so no worker answers with an
+    older seq than another worker already served.
+    """
+
+    def __init__(self, ring: SharedSampleRing, cache: dict):
+        self.ring = ring
+        self.cache = cache
+        self.columns_version = None
+        self.lock = threading.Lock()
+        self.last_error = None
+
+    def sync(self) -> int:
+        """Copies the samples published since the last call. Returns how many there were."""
+        with self.lock:
+            store = self.cache["store"]
+            version, columns, seq, timestamps, values = self.ring.read(store.seq, self.columns_version)
+            if columns is not None:
+                # New header in the reader (or first sync): start over, numbered like the ring
+                self.cache["store"] = SampleRing(columns, start_seq=seq - len(timestamps))
+                self.cache["features"] = {w: RollingFeatures(columns, w) for w in FEATURE_WINDOWS}
+                self.columns_version = version
+            for ts, row in zip(timestamps, values):
+                self.cache["store"].append(ts, row)
+                for tracker in self.cache["features"].values():
+                    tracker.append(row)
+        if len(timestamps):
+            notify_new_samples()
+        return len(timestamps)
+
+    def run(self, interval: float = FOLLOW_INTERVAL):
+        while True:
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    print(f"[pcm_reader] Error following the shared sample ring: {e}")
+                self.last_error = str(e)
+            time.sleep(interval)
+
+
+def notify_new_samples():
+    with new_samples:
+        new_samples.notify_all()
+
+
+def wait_for_samples(cache: dict, seq: int, timeout: float) -> bool:
+    """Blocks until the store holds a sample newer than `seq` (True) or the timeout expires (False)."""
+    with new_samples:
+        return new_samples.wait_for(lambda: cache["store"].seq != seq, timeout=timeout)
+
+
+def init_metrics_updater(raw_path: str, archive=None, publisher: SharedSampleRing = None) -> dict:
     """Initializes background thread and returns shared cache reference."""
-    thread = threading.Thread(target=periodic_buffer_refresh, args=(buffer_path, shared_cache), daemon=True)
+    reader = PCMTailReader(raw_path, shared_cache, archive, publisher)
+    thread = threading.Thread(target=reader.run, daemon=True)
     thread.start()
     return shared_cache
+
+
+def init_shared_follower(name: str) -> SharedStoreFollower:
+    """Attaches to the reader process's SharedSampleRing and mirrors it into the shared cache."""
+    follower = SharedStoreFollower(SharedSampleRing(name), shared_cache)
+    follower.sync()
+    threading.Thread(target=follower.run, daemon=True).start()
+    return follower
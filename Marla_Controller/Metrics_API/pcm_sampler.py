@@ -0,0 +1,175 @@
+import csv
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from pcm_reader import PCMRowParser, notify_new_samples
+from pcm_archive import writable_dir
+
+PCM_BINARY = "/home/george/Workspace/pcm/build/bin/pcm"
+PCM_INTERVAL = 1  # seconds between PCM samples
+# Raw CSV copy; the pod mounts /opt/pcm_metrics read-only, so point this at a writable volume there (empty value disables it)
+ARCHIVE_PATH = os.environ.get("METRICS_RAW_ARCHIVE", "/opt/pcm_metrics/raw_metrics.csv")
+ARCHIVE_MAX_BYTES = 100 * 1024 * 1024  # Rotate the raw archive after 100 MB
+ARCHIVE_BACKUPS = 3  # Rotated files kept (raw_metrics.csv.1 ... .3)
+RESTART_DELAY = 5  # seconds before restarting PCM after it exits
+
+
+class RawArchive:
+    """
+    Size-capped copy of PCM's raw CSV on disk, rotated like logrotate
+    (raw_metrics.csv -> raw_metrics.csv.1 -> ...). Every file starts with
+    the two PCM header rows, so each one can be read on its own.
+
+    Archiving is best effort: if the file cannot be written it is turned off
+    with a single warning, rather than failing (and restarting) the PCM reader.
+    """
+
+    def __init__(self, path: str = ARCHIVE_PATH, max_bytes: int = ARCHIVE_MAX_BYTES, backups: int = ARCHIVE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.header_lines = []
+        self.file = None
+        self.bytes_written = 0
+        self.rotations = 0
+        self.disabled = not path
+        if path and not writable_dir(os.path.dirname(path) or "."):
+            self._disable(f"{os.path.dirname(path)} is not writable")
+
+    def _disable(self, reason):
+        print(f"[pcm_sampler] Raw archive disabled, cannot write {self.path}: {reason}")
+        self.disabled = True
+        if self.file is not None:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "w")
+        self.bytes_written = 0
+        for line in self.header_lines:
+            self._write(line)
+
+    def _write(self, line: str):
+        self.file.write(line)
+        self.bytes_written += len(line)
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.rotations += 1
+        self._open()
+
+    def set_header(self, header_lines: list[str]):
+        """Starts a new file when the header changes (e.g. PCM restarted with another core layout)."""
+        if self.disabled or (header_lines == self.header_lines and self.file is not None):
+            return
+        self.header_lines = header_lines
+        try:
+            if self.file is not None and self.bytes_written:
+                self._rotate()
+            else:
+                self._open()
+        except OSError as e:
+            self._disable(e)
+
+    def write(self, line: str):
+        if self.file is None:
+            return
+        try:
+            if self.bytes_written + len(line) > self.max_bytes:
+                self._rotate()
+            self._write(line)
+            self.file.flush()
+        except OSError as e:
+            self._disable(e)
+
+
+class PCMSampler:
+    """
+    Owns the PCM child process and reads its CSV from stdout straight into
+    the in-memory store, replacing pcm_monitoring.sh and the raw file tail.
+
+    Every line is also appended to a size-capped RawArchive. PCM is restarted
+    if it exits. health() reports sample counts, lag and restarts.
+    """
+
+    def __init__(self, cache: dict, archive: RawArchive = None, command: list[str] = None, sample_archive=None,
+                 publisher=None):
+        self.parser = PCMRowParser(cache, sample_archive, publisher)
+        self.archive = archive if archive is not None else RawArchive()
+        self.command = command or [PCM_BINARY, str(PCM_INTERVAL), "-r", "-csv"]
+        if shutil.which("stdbuf"):
+            # Line-buffer PCM's stdout, otherwise samples arrive in 4 KB bursts
+            self.command = ["stdbuf", "-oL"] + self.command
+        self.process = None
+        self.samples = 0
+        self.restarts = 0
+        self.last_sample_ts = None   # PCM timestamp of the newest sample
+        self.last_sample_at = None   # Wall clock when it was read
+        self.last_error = None
+
+    def _consume(self, stdout):
+        previous = None
+        for line in stdout:
+            row = next(csv.reader([line]), [])
+            if "Date" in row and "Time" in row and previous is not None:
+                # PCM header: domain row followed by metric row
+                self.parser.set_header(previous[1], row)
+                self.archive.set_header([previous[0], line])
+            elif row and row[0][:1].isdigit() and self.parser.header is not None:
+                # Data rows start with the date; banner lines and the domain header row do not
+                self.archive.write(line)
+                if self.parser.parse_row(row):
+                    self.samples += 1
+                    self.last_sample_ts = float(self.parser.cache["store"].window(1)[0][-1])
+                    self.last_sample_at = time.time()
+                    notify_new_samples()
+            previous = (line, row)
+
+    def run(self):
+        while True:
+            try:
+                self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                                text=True, bufsize=1)
+                print(f"[pcm_sampler] Started PCM (pid {self.process.pid}): {' '.join(self.command)}")
+                self._consume(self.process.stdout)
+                self.process.wait()
+                self.last_error = f"PCM exited with code {self.process.returncode}"
+            except Exception as e:
+                self.last_error = str(e)
+            print(f"[pcm_sampler] {self.last_error}, restarting in {RESTART_DELAY}s")
+            self.restarts += 1
+            time.sleep(RESTART_DELAY)
+
+    def health(self) -> dict:
+        now = time.time()
+        return {
+            "pcm_pid": self.process.pid if self.process and self.process.poll() is None else None,
+            "samples": self.samples,
+            "skipped_rows": self.parser.skipped_rows,
+            "restarts": self.restarts,
+            "lag_seconds": round(now - self.last_sample_ts, 3) if self.last_sample_ts is not None else None,
+            "since_last_sample_seconds": round(now - self.last_sample_at, 3) if self.last_sample_at is not None else None,
+            "archive_enabled": not self.archive.disabled,
+            "archive_bytes": self.archive.bytes_written,
+            "archive_rotations": self.archive.rotations,
+            "last_error": self.last_error,
+        }
+
+
+def init_pcm_sampler(cache: dict, sample_archive=None, publisher=None) -> PCMSampler:
+    """Starts PCM under a sampler thread feeding the given cache (and optionally a SampleArchive and SharedSampleRing)."""
+    sampler = PCMSampler(cache, sample_archive=sample_archive, publisher=publisher)
+    threading.Thread(target=sampler.run, daemon=True).start()
+    return sampler
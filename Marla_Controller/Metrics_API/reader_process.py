@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+from pcm_archive import open_sample_archive
+from pcm_reader import init_metrics_updater, shared_cache, RAW_PATH
+from pcm_sampler import init_pcm_sampler
+from sample_store import SharedSampleRing
+
+STATUS_INTERVAL = 1.0  # seconds between health updates published for the workers' /health
+
+
+def main(name: str):
+    """
+    The single sample reader of multi-worker serving (see gunicorn.conf.py).
+
+    Runs the configured source (METRICS_SOURCE: "tail" or "sampler") and the
+    sample archive, publishes every sample into the SharedSampleRing `name`
+    that the server workers mirror, and refreshes its health there.
+    Returns when the gunicorn master that started it is gone.
+    """
+    ring = SharedSampleRing(name)
+    source = os.environ.get("METRICS_SOURCE", "tail")
+    archive = open_sample_archive()
+    sampler = None
+    if source == "sampler":
+        sampler = init_pcm_sampler(shared_cache, archive, ring)
+    else:
+        init_metrics_updater(RAW_PATH, archive, ring)
+    print(f"[reader_process] Publishing {source} samples to shared memory {name} (pid {os.getpid()})")
+    parent = os.getppid()
+    while os.getppid() == parent:  # Exits with the gunicorn master, however that ends
+        status = {"pid": os.getpid(), "source": source}
+        if sampler is not None:
+            status["sampler"] = sampler.health()
+        if archive is not None:
+            status["archive"] = archive.describe()
+        ring.set_status(status)
+        time.sleep(STATUS_INTERVAL)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,176 @@
+import threading
+from functools import lru_cache
+import numpy as np
+
+FEATURE_WINDOWS = (10,)  # Rolling window sizes served on /features (the Predictor uses 10)
+FEATURE_HISTORY = 40  # Samples the rolling stats are averaged over (the Predictor's local window)
+FEATURE_STATS = ("mean", "std", "p95")
+# Metrics the Predictor builds features from (matched as substrings, like compute_core_features_from_df)
+FEATURE_METRICS = ["IPC", "L3MISS", "L2MISS", "C0res%", "C1res%", "C6res%", "PhysIPC"]
+RESEED_EVERY = 1000  # Samples between exact recomputations of the running Welford state
+
+
+def window_bounds(window: int) -> tuple[int, int]:
+    """Samples before/after the labelled position in a pandas centered rolling window."""
+    return window // 2, window - 1 - window // 2
+
+
+def direct_window_stats(values: np.ndarray) -> np.ndarray:
+    """(3, n_columns) mean/std/p95 of one window, skipping NaN like pandas rolling(min_periods=1)."""
+    stats = np.full((3, values.shape[1]), np.nan)
+    counts = np.sum(~np.isnan(values), axis=0)
+    has_any = counts > 0
+    if has_any.any():
+        stats[0, has_any] = np.nanmean(values[:, has_any], axis=0)
+        stats[2, has_any] = np.nanpercentile(values[:, has_any], 95, axis=0)
+    has_two = counts > 1
+    if has_two.any():
+        stats[1, has_two] = np.nanstd(values[:, has_two], axis=0, ddof=1)
+    return stats
+
+
+class RollingFeatures:
+    """
+    Incrementally maintained rolling statistics for every column of the sample store.
+
+    Matches the Predictor's compute_windowed_stats(series, window, ...) over
+    the latest FEATURE_HISTORY samples: the mean, over all centered rolling
+    windows, of each window's mean, std and p95.
+
+    Each new sample completes exactly one full window. Its mean and std
+    come from a sliding Welford state (add the new sample, remove the one
+    that left the window); its p95 is computed exactly over the window,
+    which for 10 samples is cheaper than any streaming sketch. Full-window
+    stats are kept in a ring with running sums, so the average over the
+    history is O(1) per sample. The few partial windows at both edges of
+    the history are computed directly when features are read.
+    """
+
+    def __init__(self, columns: list[str], window: int, history: int = FEATURE_HISTORY):
+        self.columns = list(columns)
+        self.window = window
+        self.history = max(history, window)
+        self.lock = threading.Lock()
+        n_cols = len(self.columns)
+        self.samples = np.full((self.history, n_cols), np.nan)  # Latest `history` samples, ring-ordered
+        self.next = 0
+        self.count = 0
+        # Sliding Welford state over the trailing `window` samples (NaN samples are skipped)
+        self.n = np.zeros(n_cols)
+        self.mean = np.zeros(n_cols)
+        self.m2 = np.zeros(n_cols)
+        # Ring of full-window stats for the last (history - window + 1) samples, with running sums
+        self.full_windows = self.history - window + 1
+        self.window_stats = np.full((self.full_windows, 3, n_cols), np.nan)
+        self.stats_sum = np.zeros((3, n_cols))
+        self.stats_valid = np.zeros((3, n_cols))
+        self.since_reseed = 0
+
+    def _latest(self, k: int) -> np.ndarray:
+        """The latest k samples, oldest first."""
+        idx = (self.next - k + np.arange(k)) % self.history
+        return self.samples[idx]
+
+    def _welford_add(self, x: np.ndarray, sign: int):
+        mask = ~np.isnan(x)
+        self.n += sign * mask
+        safe_n = np.where(self.n > 0, self.n, 1)
+        delta = np.where(mask, x - self.mean, 0.0)
+        self.mean = np.where(self.n > 0, self.mean + sign * delta / safe_n, 0.0)
+        self.m2 = np.where(self.n > 0, self.m2 + sign * delta * np.where(mask, x - self.mean, 0.0), 0.0)
+
+    def _reseed(self):
+        """Recomputes the Welford state exactly, so floating-point drift from removals cannot build up."""
+        window = self._latest(min(self.count, self.window))
+        self.n = np.sum(~np.isnan(window), axis=0).astype(np.float64)
+        self.mean = np.nansum(window, axis=0) / np.maximum(self.n, 1)
+        self.m2 = np.nansum((window - self.mean) ** 2, axis=0)
+        self.since_reseed = 0
+
+    def append(self, values) -> None:
+        x = np.asarray(values, dtype=np.float64)
+        with self.lock:
+            if self.count >= self.window:
+                self._welford_add(self._latest(self.window)[0], -1)
+            self.samples[self.next] = x
+            self.next = (self.next + 1) % self.history
+            self.count += 1
+            self._welford_add(x, +1)
+
+            self.since_reseed += 1
+            if self.since_reseed >= RESEED_EVERY:
+                self._reseed()
+
+            if self.count < self.window:
+                return
+            stats = np.full((3, len(self.columns)), np.nan)
+            stats[0] = np.where(self.n > 0, self.mean, np.nan)
+            stats[1] = np.where(self.n > 1, np.sqrt(np.maximum(self.m2, 0.0) / np.maximum(self.n - 1, 1)), np.nan)
+            window = self._latest(self.window)
+            if np.isnan(window).any():
+                stats[2] = direct_window_stats(window)[2]
+            else:
+                stats[2] = np.percentile(window, 95, axis=0)
+
+            slot = (self.count - self.window) % self.full_windows
+            old = self.window_stats[slot]
+            if self.count - self.window >= self.full_windows:
+                self.stats_sum -= np.nan_to_num(old)
+                self.stats_valid -= ~np.isnan(old)
+            self.window_stats[slot] = stats
+            self.stats_sum += np.nan_to_num(stats)
+            self.stats_valid += ~np.isnan(stats)
+
+    def stats(self) -> dict[str, np.ndarray]:
+        """{stat: per-column value} averaged over all rolling windows of the latest history."""
+        with self.lock:
+            rows = min(self.count, self.history)
+            before, after = window_bounds(self.window)
+            if rows == 0:
+                return {}
+            samples = self._latest(rows)
+            total = np.zeros((3, len(self.columns)))
+            valid = np.zeros((3, len(self.columns)))
+            if rows == self.history:
+                total += self.stats_sum
+                valid += self.stats_valid
+                partial = list(range(before)) + list(range(rows - after, rows))
+            else:
+                # Still filling the history: every window is computed directly
+                partial = range(rows)
+            for i in partial:
+                s = direct_window_stats(samples[max(0, i - before):min(rows, i + after + 1)])
+                total += np.nan_to_num(s)
+                valid += ~np.isnan(s)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averaged = np.where(valid > 0, total / valid, np.nan)
+        return dict(zip(FEATURE_STATS, averaged))
+
+
+@lru_cache(maxsize=64)
+def node_feature_columns(columns: tuple[str, ...], cores: tuple[tuple[str, str], ...]) -> tuple[tuple[int, str], ...]:
+    """
+    Resolves which store columns feed a node's features and their Predictor
+    name stems, e.g. "Core0 (Socket 0) - IPC" -> (idx, "Core3_IPC").
+    Cached per (header, core set), so it runs once per header change.
+    """
+    core_map = dict(cores)
+    plan = []
+    for idx, col in enumerate(columns):
+        if " - " not in col:
+            continue
+        domain, metric = col.split(" - ", 1)
+        if domain in core_map and any(m in metric for m in FEATURE_METRICS):
+            plan.append((idx, f"{core_map[domain]}_{metric.replace('%', '')}"))
+    return tuple(plan)
+
+
+def node_features(tracker: RollingFeatures, cores: dict[str, str]) -> dict[str, float]:
+    """Returns one node's {feature_name: value} using the Predictor's "<stat>_Core<n>_<metric>" names."""
+    stats = tracker.stats()
+    features = {}
+    for idx, stem in node_feature_columns(tuple(tracker.columns), tuple(sorted(cores.items()))):
+        for stat, values in stats.items():
+            value = values[idx]
+            features[f"{stat}_{stem}"] = None if np.isnan(value) else float(value)
+    return features
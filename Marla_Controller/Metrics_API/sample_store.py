@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+RETENTION_SECONDS = 40  # How much PCM history the API keeps in memory
+SAMPLE_HZ = 1  # PCM sampling rate (pcm 1 -> one sample per second)
+SHARED_MAX_COLUMNS = 2048  # Metric columns a SharedSampleRing can hold (PCM keeps about 10 per core)
+SHARED_COLUMNS_BYTES = 256 * 1024  # Room for the JSON column names
+SHARED_STATUS_BYTES = 64 * 1024  # Room for the reader's JSON status (sampler/archive health)
+SHARED_STORE_ENV = "METRICS_SHARED_STORE"  # Names the SharedSampleRing of the reader process (set by gunicorn.conf.py)
+
+
+class SampleRing:
+    """
+    Fixed-capacity, NumPy-backed ring buffer of PCM samples.
+
+    Holds one float64 column per kept core metric plus a timestamp column.
+    Every sample is written twice (at i and i + capacity), so the latest
+    n samples are always one contiguous slice and window() can hand out
+    zero-copy views. Append and eviction are O(1).
+
+    Every sample gets a monotonic sequence number (the first one is
+    start_seq + 1), so clients can ask only for samples newer than the
+    last one they have seen.
+
+    Views alias the live buffer: hold `lock` while using them, or call
+    select(), which returns private copies.
+    """
+
+    def __init__(self, columns: list[str], capacity: int = RETENTION_SECONDS * SAMPLE_HZ, start_seq: int = 0):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self._timestamps = np.full(2 * capacity, np.nan, dtype=np.float64)
+        self._values = np.full((2 * capacity, len(self.columns)), np.nan, dtype=np.float64)
+        self._next = 0  # Write position in [0, capacity)
+        self.count = 0
+        self.seq = start_seq  # Sequence number of the newest sample
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp: float, values) -> None:
+        """Appends one sample in place, evicting the oldest one when full."""
+        with self.lock:
+            i = self._next
+            self._timestamps[i] = self._timestamps[i + self.capacity] = timestamp
+            self._values[i] = values
+            self._values[i + self.capacity] = self._values[i]
+            self._next = (i + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            self.seq += 1
+
+    def window(self, n: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """Zero-copy (timestamps, values) views of the latest n samples, oldest first."""
+        n = self.count if n is None else max(0, min(n, self.count))
+        end = self._next + self.capacity
+        return self._timestamps[end - n:end], self._values[end - n:end]
+
+    def select(self, since: int = None, seconds: float = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        """
+        Private copies of (seqs, timestamps, values) for the samples newer than
+        sequence number `since` and/or taken in the last `seconds`, plus the
+        newest sequence number read under the same lock (what the copies are current to).
+        If `since` is older than the retained history, all retained samples are returned.
+        """
+        with self.lock:
+            n = self.count
+            if since is not None:
+                n = max(0, min(n, self.seq - since))
+            timestamps, values = self.window(n)
+            if seconds is not None and len(timestamps):
+                start = np.searchsorted(timestamps, self._timestamps[self._next + self.capacity - 1] - seconds, side="right")
+                timestamps, values = timestamps[start:], values[start:]
+            seqs = np.arange(self.seq - len(timestamps) + 1, self.seq + 1, dtype=np.int64)
+            return seqs, timestamps.copy(), values.copy(), self.seq
+
+
+class SharedSampleRing:
+    """
+    The latest PCM samples in a multiprocessing.shared_memory block, written
+    by one reader process and read by every server worker.
+
+    Layout: an int64 control block, the JSON column names, the reader's JSON
+    status, then `capacity` timestamp and value rows (a plain ring; readers
+    copy rows by sequence number). The writer brackets every change with the
+    generation counter (a seqlock): it is odd while a write is in progress,
+    and a reader retries until no write overlapped its copy, so readers
+    never block the writer or each other.
+    """
+
+    GEN, SEQ, COUNT, NEXT, CAPACITY, COLUMNS_VERSION, N_COLUMNS, COLUMNS_LEN, STATUS_LEN = range(9)
+    CONTROL_SLOTS = 16
+
+    def __init__(self, name: str = None, capacity: int = RETENTION_SECONDS * SAMPLE_HZ):
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self._offsets(capacity)[-1])
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creating process unlinks the block, so attaching ones must not leave it to their resource tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.control = np.ndarray((self.CONTROL_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self.control[:] = 0
+            self.control[self.CAPACITY] = capacity
+        self.capacity = int(self.control[self.CAPACITY])
+        columns_at, status_at, timestamps_at, values_at, _ = self._offsets(self.capacity)
+        self._columns = np.ndarray((SHARED_COLUMNS_BYTES,), dtype=np.uint8, buffer=self.shm.buf, offset=columns_at)
+        self._status = np.ndarray((SHARED_STATUS_BYTES,), dtype=np.uint8, buffer=self.shm.buf, offset=status_at)
+        self._timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=self.shm.buf, offset=timestamps_at)
+        self._values = np.ndarray((self.capacity, SHARED_MAX_COLUMNS), dtype=np.float64, buffer=self.shm.buf, offset=values_at)
+
+    @classmethod
+    def _offsets(cls, capacity: int) -> tuple[int, int, int, int, int]:
+        """Byte offsets of the columns, status, timestamp and value regions, and the total size."""
+        columns_at = cls.CONTROL_SLOTS * 8
+        status_at = columns_at + SHARED_COLUMNS_BYTES
+        timestamps_at = status_at + SHARED_STATUS_BYTES
+        values_at = timestamps_at + capacity * 8
+        return columns_at, status_at, timestamps_at, values_at, values_at + capacity * SHARED_MAX_COLUMNS * 8
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def seq(self) -> int:
+        return int(self.control[self.SEQ])
+
+    def _write(self, update):
+        self.control[self.GEN] += 1  # Odd: write in progress
+        try:
+            update()
+        finally:
+            self.control[self.GEN] += 1
+
+    def _read(self, copy):
+        """Runs `copy` until no write overlapped it, then returns its result."""
+        while True:
+            gen = int(self.control[self.GEN])
+            if gen % 2 == 0:
+                result = copy()
+                if int(self.control[self.GEN]) == gen:
+                    return result
+            time.sleep(0)
+
+    def set_columns(self, columns: list[str]) -> None:
+        """Starts over with new columns (PCM header change). Sequence numbers keep counting."""
+        encoded = np.frombuffer(json.dumps(list(columns)).encode(), dtype=np.uint8)
+        if len(columns) > SHARED_MAX_COLUMNS or len(encoded) > SHARED_COLUMNS_BYTES:
+            raise ValueError(f"{len(columns)} columns do not fit the shared sample ring")
+
+        def update():
+            self._columns[:len(encoded)] = encoded
+            self.control[self.COLUMNS_LEN] = len(encoded)
+            self.control[self.N_COLUMNS] = len(columns)
+            self.control[self.COUNT] = self.control[self.NEXT] = 0
+            self.control[self.COLUMNS_VERSION] += 1
+        self._write(update)
+
+    def append(self, timestamp: float, values) -> None:
+        """Appends one sample, evicting the oldest one when full."""
+        def update():
+            i = int(self.control[self.NEXT])
+            self._timestamps[i] = timestamp
+            self._values[i, :self.control[self.N_COLUMNS]] = values
+            self.control[self.NEXT] = (i + 1) % self.capacity
+            self.control[self.COUNT] = min(self.control[self.COUNT] + 1, self.capacity)
+            self.control[self.SEQ] += 1
+        self._write(update)
+
+    def set_status(self, status: dict) -> None:
+        """Publishes the reader's health (sampler, archive) for the workers' /health."""
+        encoded = np.frombuffer(json.dumps(status).encode(), dtype=np.uint8)
+        if len(encoded) > SHARED_STATUS_BYTES:
+            encoded = np.frombuffer(b"{}", dtype=np.uint8)
+
+        def update():
+            self._status[:len(encoded)] = encoded
+            self.control[self.STATUS_LEN] = len(encoded)
+        self._write(update)
+
+    def read(self, since: int, columns_version: int = None) -> tuple[int, list[str], int, np.ndarray, np.ndarray]:
+        """
+        Copies of the retained samples newer than sequence number `since`, as
+        (columns version, columns, newest seq, timestamps, values). The columns
+        are only decoded when their version differs from `columns_version` (None otherwise).
+        """
+        def copy():
+            version = int(self.control[self.COLUMNS_VERSION])
+            columns = None
+            if version != columns_version:
+                columns = bytes(self._columns[:int(self.control[self.COLUMNS_LEN])])
+            seq, count, next_row = int(self.control[self.SEQ]), int(self.control[self.COUNT]), int(self.control[self.NEXT])
+            n = max(0, min(count, seq - since))
+            rows = (next_row - n + np.arange(n)) % self.capacity
+            return version, columns, seq, self._timestamps[rows], self._values[rows, :int(self.control[self.N_COLUMNS])]
+        version, columns, seq, timestamps, values = self._read(copy)
+        if columns is not None:
+            columns = json.loads(columns) if columns else []
+        return version, columns, seq, timestamps, values
+
+    def status(self) -> dict:
+        encoded = self._read(lambda: bytes(self._status[:int(self.control[self.STATUS_LEN])]))
+        return json.loads(encoded) if encoded else {}
+
+    def close(self):
+        """Detaches; the creating process also removes the block."""
+        self.control = self._columns = self._status = self._timestamps = self._values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,137 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)  # Upper bounds, +inf is implicit
+RESPONSE_CACHE_ENTRIES = 64  # Serialised /metrics bodies kept for the current sample
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds), cheap enough to update on every request."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return round(self.max_ms, 3)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class RequestStats:
+    """
+    Per-endpoint request latency histograms and status counts, fed by
+    Flask before/after request hooks and served on /stats.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.statuses = {}
+        self.started = time.time()
+
+    def install(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def _start_timer():
+            g.request_started = time.perf_counter()
+
+        @app.after_request
+        def _record(response):
+            started = g.pop("request_started", None)
+            if started is not None:
+                # Streaming responses (/stream) are timed up to their first byte only
+                self.observe(request.url_rule.rule if request.url_rule else "<unmatched>",
+                             response.status_code, (time.perf_counter() - started) * 1000)
+            return response
+
+    def observe(self, endpoint: str, status: int, ms: float):
+        with self.lock:
+            self.histograms.setdefault(endpoint, LatencyHistogram()).observe(ms)
+            key = (endpoint, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def summary(self) -> dict:
+        with self.lock:
+            endpoints = {}
+            for endpoint, histogram in self.histograms.items():
+                endpoints[endpoint] = histogram.summary()
+                endpoints[endpoint]["status"] = {str(s): n for (e, s), n in self.statuses.items() if e == endpoint}
+            return {"uptime_seconds": round(time.time() - self.started, 1), "endpoints": endpoints}
+
+
+class ResponseCache:
+    """
+    Serialised response bodies keyed by (store, newest seq, request parameters).
+
+    Many pollers asking for the same samples between two PCM samples get the
+    bytes serialised by the first one. Entries for older samples are dropped
+    as soon as a new sample arrives.
+
+    `build` returns (body, version) with the version the body was actually
+    built from, and the body is only kept if that is the version it was
+    looked up under. A sample landing between reading the version and
+    building the body therefore never files newer rows under an older key.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: tuple, key: tuple, build) -> tuple:
+        """Returns (body, version it was built from)."""
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+            body = self.entries.get(key)
+            if body is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return body, version
+            self.misses += 1
+        body, built = build()
+        with self.lock:
+            if built == version == self.version:
+                self.entries[key] = body
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return body, built
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,29 @@
+import json
+import os
+
+TOPOLOGY_PATH = "./topology.json"
+# Fallback when no topology file is deployed: the two minikube nodes share one
+# PCM host, cores 0-2 belong to node1 and 3-5 to node2 (both seen as Core3-5).
+DEFAULT_TOPOLOGY = {
+    "node1": {"cores": {"Core0 (Socket 0)": "Core3", "Core1 (Socket 0)": "Core4", "Core2 (Socket 0)": "Core5"}},
+    "node2": {"cores": {"Core3 (Socket 0)": "Core3", "Core4 (Socket 0)": "Core4", "Core5 (Socket 0)": "Core5"}},
+}
+
+
+def load_topology(path: str = TOPOLOGY_PATH) -> dict[str, dict]:
+    """
+    Loads the node -> core-set topology.
+
+    Format: {"nodes": {"<node>": {"cores": {"<PCM core domain>": "<feature core>"},
+                                 "url": "<remote Metrics API>"}}}
+    Nodes without "url" are read from this host's PCM; nodes with one are
+    pulled from the Metrics API agent running on that node.
+    """
+    if not os.path.exists(path):
+        return DEFAULT_TOPOLOGY
+    with open(path, "r") as f:
+        nodes = json.load(f)["nodes"]
+    for node, spec in nodes.items():
+        if not spec.get("cores"):
+            raise ValueError(f"Topology node '{node}' has no cores")
+    return nodes
@@ -1,22 +1,34 @@
-from flask import Flask, request, jsonify
-import os
-import pickle
-import requests
-import pandas as pd
+from __future__ import annotations  # Annotations stay unevaluated, so pd.DataFrame does not import pandas
+
+import math
+import threading
+import time
 from typing import Dict, List
-from io import StringIO
-from collections import defaultdict
-import numpy as np
-import joblib
-import json
-import xgboost as xgb
+from concurrent.futures import ThreadPoolExecutor
+from startup import profile, LazyModule
+
+with profile.phase("import flask, requests, numpy"):
+    from flask import Flask, request, jsonify
+    import requests
+    import numpy as np
+# Only the poll/local feature path uses pandas directly. Kept lazy so /health answers ~0.4 s sooner;
+# readiness is not sped up, since loading the xgboost model imports pandas anyway
+pd = LazyModule("pandas")
+with profile.phase("import service modules"):
+    from metrics_client import MetricsWindow, MetricsSubscriber
+    from model_registry import ModelRegistry
+    from feature_kernel import MODEL_INPUTS
+    from coalescing import SingleFlight, PredictionBatcher
+    from instrumentation import StageTimers, PROMETHEUS_MIMETYPE
 
 import logging
 import sys
 
+LOG_LEVEL = logging.INFO  # DEBUG logs every fetch and feature matrix, which costs time on each request
+
 # Configure basic logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=LOG_LEVEL,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)  # Output to stdout
@@ -25,43 +37,121 @@ logging.basicConfig(
 
 app = Flask(__name__)
 app.logger.addHandler(logging.StreamHandler(sys.stdout))
-app.logger.setLevel(logging.DEBUG)
+app.logger.setLevel(LOG_LEVEL)
 
 # Load the model at startup
 MODEL_PATH = './slowdown_predictor.pkl'
+# Expected feature order (from your model)
+# This list is stored in the feature_names.json file
+FEATURE_NAMES_PATH = './feature_names.json'
+COMPILED_INFERENCE = True  # Score with the array-compiled trees (tree_compiler.py) when they match the model
+MODEL_WATCH = True  # Hot-reload the model when MODEL_PATH or FEATURE_NAMES_PATH change on disk
 
-try:
-    model = joblib.load(MODEL_PATH)
-    model_loaded = True
-except Exception as e:
-    model_loaded = False
-    print(f"Error loading model: {e}")
+# The model is loaded by warm_up() in the background, so /health answers right away
+models = ModelRegistry(MODEL_PATH, FEATURE_NAMES_PATH, compiled=COMPILED_INFERENCE)
+readiness = {"ready": False, "error": None}
 
 # Configuration
 METRICS_SERVICE_URL = "http://localhost:30090/metrics"
+STREAM_SERVICE_URL = "http://localhost:30090/stream"
+METRICS_MODE = "stream"  # "stream": hot window pushed by the Metrics API (no network I/O in /predict), "poll": fetch per request
+FEATURES_SERVICE_URL = "http://localhost:30090/features"
+NODES_SERVICE_URL = "http://localhost:30090/nodes"
+FEATURE_SOURCE = "server"  # "server": rolling features precomputed by the Metrics API, "local": computed here from /metrics
+FEATURE_WINDOW = 10  # Rolling window (samples) the model features are computed with
 REQUEST_TIMEOUT = 5  # seconds
+MAX_GRID_POINTS = 10000  # (RPS, replicas) points per node accepted by /predict_grid and /predict
+# Concurrent requests (e.g. one controller per deployment) share one feature fetch and, within
+# this window, one batched model call; 0 scores each request on its own
+COALESCE_WINDOW = 0.002  # seconds
+metrics_window = MetricsWindow(METRICS_SERVICE_URL, REQUEST_TIMEOUT)
+metrics_subscriber = MetricsSubscriber(STREAM_SERVICE_URL)
+if METRICS_MODE == "stream":
+    metrics_subscriber.start()
+local_features_cache = {"seq": None, "features": None}  # Features of the streamed window, per last sample
+
+# Node -> {PCM core domain: feature core}, used until the Metrics API topology is known
+DEFAULT_TOPOLOGY = {
+    'node1': {'cores': {'Core0 (Socket 0)': 'Core3', 'Core1 (Socket 0)': 'Core4', 'Core2 (Socket 0)': 'Core5'}, 'source': 'local'},
+    'node2': {'cores': {'Core3 (Socket 0)': 'Core3', 'Core4 (Socket 0)': 'Core4', 'Core5 (Socket 0)': 'Core5'}, 'source': 'local'},
+}
+TOPOLOGY_TTL = 30  # seconds before /nodes is asked again, so topology.json edits on the Metrics API are picked up
+topology_cache = {"nodes": None, "version": None, "fetched_at": 0.0}
+node_pool = ThreadPoolExecutor(max_workers=8)  # Parallel per-node feature fetches
+feature_flight = SingleFlight()
+model_batcher = PredictionBatcher(COALESCE_WINDOW)
+stage_timers = StageTimers()  # Per-stage request latency, exported on /metrics
 
 @app.route('/health')
 def health():
+    """Liveness: the process is up and serving, even while the model is still loading."""
     app.logger.info("Health check endpoint called")
-    if model_loaded:
+    if models.current is not None:
         return {"status": "healthy", "model": "loaded"}, 200
     else:
-        return {"status": "unhealthy", "model": "not loaded"}, 500
+        return {"status": "healthy", "model": "failed" if readiness["error"] else "loading"}, 200
+
+@app.route('/ready')
+def ready():
+    """Readiness: the model is loaded and a warm-up batch went through it."""
+    body = {"ready": readiness["ready"], "error": readiness["error"], "startup": profile.summary()}
+    return body, 200 if readiness["ready"] else 503
 
 @app.route('/model_info')
 def model_info():
-    if not model_loaded:
+    current = models.current
+    if current is None:
         return {"error": "Model not loaded"}, 500
     
     try:
         return {
             "status": "model loaded",
-            "n_features": len(EXPECTED_FEATURES)  # Simple confirmation
+            "n_features": len(current.feature_names),  # Simple confirmation
+            "version": current.version,
+            "inference": "compiled" if current.compiled is not None else "xgboost",
+            "prediction_cache": current.cache.stats(),
+            "coalescing": {"feature_fetches": feature_flight.stats(), "model_calls": model_batcher.stats()},
+            "models": models.describe()
         }
     except Exception as e:
         return {"error": str(e)}, 500
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition: per-stage latency histograms and feature drift of the current model."""
+    lines = stage_timers.prometheus()
+    current = models.current
+    if current is not None:
+        lines += current.drift.prometheus()
+    return "\n".join(lines) + "\n", 200, {"Content-Type": PROMETHEUS_MIMETYPE}
+
+@app.route('/drift')
+def drift():
+    """Rolling summary of each PCM feature against the range the current model was trained on."""
+    current = models.current
+    if current is None:
+        return {"error": "Model not loaded"}, 500
+    summary = current.drift.summary()
+    return jsonify({"version": current.version, "drifted": [name for name, s in summary.items() if s["drift"]], "features": summary})
+
+@app.route('/reload', methods=['POST'])
+def reload_model():
+    """Loads MODEL_PATH and FEATURE_NAMES_PATH again, validates them and swaps them in."""
+    try:
+        version = models.load()
+        return jsonify({"status": "reloaded", "model": version.describe()})
+    except Exception as e:
+        return jsonify({"error": f"Reload failed, still serving version {models.current.version if models.current else None}: {e}"}), 500
+
+@app.route('/rollback', methods=['POST'])
+def rollback_model():
+    """Re-activates a previous model version (?version=<n>, the latest previous one by default)."""
+    try:
+        version = models.rollback(request.args.get('version', type=int))
+        return jsonify({"status": "rolled back", "model": version.describe()})
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0]), "models": models.describe()}), 404
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """
@@ -73,38 +163,194 @@ def predict():
         # Get input parameters
         data = request.get_json()
         replicas = data['replicas']
-        rps = data['rps']
-        # Fetch metrics from Monitoring Subsystem, from all nodes
-        metrics_data = fetch_metrics()
-        # Process metrics per node
-        node_metrics = process_metrics_per_node(metrics_data)
-        
-        # For each replica count, compute predictions
-        all_predictions = {}
-        for rep_count in range(1, replicas + 1):
-            features = calculate_features(node_metrics, replicas=rep_count, rps=rps)
-            predictions = make_predictions(features)
-            all_predictions[str(rep_count)] = predictions  # use str keys for JSON compatibility
-
-        return jsonify(all_predictions)
+        rps = float(data['rps'])
+        if isinstance(replicas, bool) or int(replicas) != replicas:
+            raise ValueError(f"replicas must be an integer, got {replicas!r}")
+        replicas = int(replicas)
+        if not 1 <= replicas <= MAX_GRID_POINTS:
+            return jsonify({"error": f"replicas must be 1..{MAX_GRID_POINTS}, got {replicas}"}), 400
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({"error": f"Invalid prediction request: {str(e)}"}), 400
+
+    try:
+        # Get PCM features per node from Monitoring Subsystem
+        node_features = feature_flight.do("features", get_node_features)  # Shared with concurrent requests
+
+        # Score every (node, replica count) in one batched model call
+        replica_counts = range(1, replicas + 1)
+        surface = predict_surface(node_features, replica_counts, [rps])
+        with stage_timers.time("serialization"):
+            all_predictions = {
+                str(rep_count): {node: float(surface[n, 0, r]) for n, node in enumerate(node_features)}  # use str keys for JSON compatibility
+                for r, rep_count in enumerate(replica_counts)
+            }
+            return jsonify(all_predictions)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/predict_grid', methods=['POST'])
+def predict_grid():
+    """
+    Endpoint that predicts the whole normalized-performance surface per node:
+    - rps: explicit list of request rates, or
+      rps_min, rps_max, rps_step: an inclusive RPS range
+    - max_replicas: replica counts 1..max_replicas are scored
+    Returns {"rps": [...], "replicas": [...], "predictions": {node: [[NP per replica count] per RPS]}}.
+    """
+    try:
+        data = request.get_json()
+        max_replicas = int(data['max_replicas'])
+        # Size the grid arithmetically first: nothing is allocated until it is known to be within bounds
+        if 'rps' in data:
+            n_rps = len(data['rps'])
+        else:
+            rps_min, rps_max, rps_step = float(data['rps_min']), float(data['rps_max']), float(data['rps_step'])
+            if not rps_step > 0:
+                return jsonify({"error": f"rps_step must be positive, got {rps_step}"}), 400
+            n_rps = math.floor((rps_max - rps_min) / rps_step + 1e-9) + 1  # Tolerance keeps rps_max in despite rounding
+        points = n_rps * max_replicas
+        if max_replicas < 1 or n_rps < 1 or points > MAX_GRID_POINTS:
+            return jsonify({"error": f"Grid must have 1..{MAX_GRID_POINTS} points per node, got {points}"}), 400
+
+        if 'rps' in data:
+            rps_values = np.asarray(data['rps'], dtype=np.float64)
+            if rps_values.shape != (n_rps,):
+                raise ValueError("rps must be a flat list of numbers")
+        else:
+            rps_values = rps_min + rps_step * np.arange(n_rps, dtype=np.float64)
+        replica_counts = np.arange(1, max_replicas + 1)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({"error": f"Invalid grid request: {str(e)}"}), 400
+
+    try:
+        node_features = feature_flight.do("features", get_node_features)  # Shared with concurrent requests
+        surface = predict_surface(node_features, replica_counts, rps_values)
+        with stage_timers.time("serialization"):
+            return jsonify({
+                "rps": rps_values.tolist(),
+                "replicas": replica_counts.tolist(),
+                "predictions": {node: surface[n].tolist() for n, node in enumerate(node_features)},
+            })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def get_topology() -> Dict[str, dict]:
+    """
+    Node topology served by the Metrics API (/nodes), fetched again every TOPOLOGY_TTL
+    seconds or right after invalidate_topology().
+    Falls back to the last known topology, or DEFAULT_TOPOLOGY (retried on the next call), when unavailable.
+    """
+    if topology_cache["nodes"] is None or time.time() - topology_cache["fetched_at"] > TOPOLOGY_TTL:
+        try:
+            response = requests.get(NODES_SERVICE_URL, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            nodes = response.json()["nodes"]
+            if topology_cache["nodes"] is None or list(nodes) != list(topology_cache["nodes"]):
+                app.logger.info(f"Node topology: {list(nodes)}")
+            topology_cache.update(nodes=nodes, version=response.headers.get("X-Topology-Version"), fetched_at=time.time())
+        except Exception as e:
+            if topology_cache["nodes"] is None:
+                app.logger.warning(f"Node topology unavailable, using default: {e}")
+                return DEFAULT_TOPOLOGY
+            app.logger.warning(f"Node topology unavailable, keeping the last one: {e}")
+            topology_cache["fetched_at"] = time.time()
+    return topology_cache["nodes"]
+
+def invalidate_topology():
+    """Makes the next get_topology() call ask /nodes again."""
+    topology_cache["fetched_at"] = 0.0
+
+def fetch_node_server_features(node: str) -> Dict[str, float]:
+    response = requests.get(FEATURES_SERVICE_URL, params={"window": FEATURE_WINDOW, "node": node}, timeout=REQUEST_TIMEOUT)
+    version = response.headers.get("X-Topology-Version")
+    if response.status_code == 404 or (version is not None and version != topology_cache["version"]):
+        invalidate_topology()  # Node removed or renamed, or the topology changed since /nodes was read
+    response.raise_for_status()
+    payload = response.json()
+    if not payload.get("samples"):
+        raise Exception(f"No metrics data received from collector for {node}")
+    # Missing values are sent as null
+    return {name: np.nan if value is None else value for name, value in payload["features"][node].items()}
+
+def fetch_server_features(nodes: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Fetch rolling PCM features per node, precomputed by the metrics collector service.
+    One request per node, issued in parallel.
+    Returns: {node: {feature_name: value}}
+    """
+    app.logger.debug(f"Fetching features for {nodes} from {FEATURES_SERVICE_URL}")
+    with stage_timers.time("metrics_fetch"):
+        features = dict(zip(nodes, node_pool.map(fetch_node_server_features, nodes)))
+    if models.current is not None:
+        models.current.drift.observe(features)
+    return features
+
+def get_node_features() -> Dict[str, Dict[str, float]]:
+    """
+    PCM features per node. In "stream" mode they are computed from the hot
+    window kept by the subscriber, without any network I/O, and reused until
+    a new sample arrives. Otherwise (or while the stream is down) they come
+    from the Metrics API when FEATURE_SOURCE is "server", falling back to
+    local computation from /metrics.
+    """
+    topology = get_topology()
+    # Nodes mirrored from remote agents are only available as server-side features
+    local_topology = {node: spec for node, spec in topology.items() if spec.get('source', 'local') == 'local'}
+    remote_nodes = [node for node in topology if node not in local_topology]
+
+    if METRICS_MODE == "stream" and metrics_subscriber.is_fresh(FEATURE_WINDOW):
+        with stage_timers.time("metrics_fetch"):
+            columns, seq, values = metrics_subscriber.window()
+        key = (seq, models.current.version if models.current else None)
+        if local_features_cache["seq"] != key:
+            local_features_cache["features"] = compute_local_features(columns, values, local_topology)
+            local_features_cache["seq"] = key
+        features = dict(local_features_cache["features"])
+    else:
+        if FEATURE_SOURCE == "server":
+            try:
+                return fetch_server_features(list(topology))
+            except Exception as e:
+                app.logger.warning(f"Server-side features unavailable, computing locally: {e}")
+        with stage_timers.time("metrics_fetch"):
+            df = fetch_metrics()
+            columns = [col for col in df.columns if ' - ' in col]  # Per-core metrics, without Seq/Date/Time/Timestamp
+            values = df[columns].to_numpy(dtype=np.float64)
+        features = compute_local_features(columns, values, local_topology)
+
+    if remote_nodes:
+        features.update(fetch_server_features(remote_nodes))
+    return features
+
+def compute_local_features(columns: List[str], values: np.ndarray, topology: Dict[str, dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Computes each node's PCM features from a (time x metric) window of raw Metrics API
+    columns, using the node's core mapping (e.g. node1 cores 0-2 → model cores 3-5).
+    Only the features the current model uses are computed (see FeaturePlan).
+    """
+    current = models.current
+    if current is None:
+        raise Exception("Feature error: model not loaded")
+    with stage_timers.time("feature_extraction"):
+        features = {
+            node_name: current.feature_plan.extract(columns, values, spec['cores'], FEATURE_WINDOW)
+            for node_name, spec in topology.items()
+        }
+    current.drift.observe(features)
+    return features
+
 def fetch_metrics() -> pd.DataFrame:
     """
     Fetch PCM metrics from metrics collector service
+    Only samples newer than the local window are transferred (see MetricsWindow).
     Returns: DataFrame containing all metrics
     """
     try:
-        # Fetch CSV data from metrics collector
         app.logger.debug(f"Fetching metrics from {METRICS_SERVICE_URL}")
-        response = requests.get(f"{METRICS_SERVICE_URL}", timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        
-        # Convert streaming CSV response to DataFrame
-        csv_data = response.content.decode('utf-8')
-        df = pd.read_csv(StringIO(csv_data))
+        df = metrics_window.refresh()
+        if df.empty:
+            raise pd.errors.EmptyDataError("empty metrics window")
 
         app.logger.debug(f"Fetched {len(df)} rows of metrics data")
         
@@ -118,169 +364,76 @@ def fetch_metrics() -> pd.DataFrame:
     except Exception as e:
         raise Exception(f"Error processing metrics data: {str(e)}")
 
-def process_metrics_per_node(metrics_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+def build_feature_matrix(node_features: Dict[str, Dict[str, float]], replica_counts, rps_values,
+                         feature_names: List[str]) -> np.ndarray:
     """
-    Split metrics by node and rename core columns for node1 (cores 0-2 → 3-5).
-    Keep only per-core metrics and system Date/Time.
+    Builds one model input row per (node, RPS, replica count), in that nesting order.
+    The PCM part of each node's vector is assembled once and repeated; only the
+    RPS and Replicas_x columns vary across a node's rows.
     """
-    df = metrics_df.copy()
-    app.logger.debug(f"Processing metrics for {len(df)} rows")
-
-    # Mapping of core column prefixes to target node and renamed core
-    core_mapping = {
-        'Core0 (Socket 0)': ('node1', 'Core3'),
-        'Core1 (Socket 0)': ('node1', 'Core4'),
-        'Core2 (Socket 0)': ('node1', 'Core5'),
-        'Core3 (Socket 0)': ('node2', 'Core3'),
-        'Core4 (Socket 0)': ('node2', 'Core4'),
-        'Core5 (Socket 0)': ('node2', 'Core5'),
-    }
-
-    # Always retain System Date and Time
-    base_columns = ['Date', 'Time']
-
-    # Initialize container
-    node_data = {'node1': df[base_columns].copy(), 'node2': df[base_columns].copy()}
-
-    # Loop through mapping and assign columns
-    for original_prefix, (node, new_prefix) in core_mapping.items():
-        core_cols = [col for col in df.columns if col.startswith(original_prefix)]
-        renamed_cols = [col.replace(original_prefix, new_prefix) for col in core_cols]
-        node_data[node][renamed_cols] = df[core_cols].values
-
-    app.logger.debug(f"Processed metrics for nodes: {list(node_data.keys())}")
-    # Length of each node's DataFrame
-    for node, data in node_data.items():
-        app.logger.debug(f"{node} has {len(data)} rows of metrics data")
-        #print(f"[{node}] first 6 rows:\n{data.head(6)}")  # DEBUG 
-    return node_data
-
-
-def compute_windowed_stats(series, window_size, stats):
-    """Compute rolling-window-based stats for a Series."""
-    results = {}
-    if window_size:
-        win = series.rolling(window=window_size, center=True, min_periods=1)
-        if 'mean' in stats: results['mean'] = win.mean().mean()
-        if 'std' in stats: results['std'] = win.std().mean()
-        if 'max' in stats: results['max'] = win.max().mean()
-        if 'min' in stats: results['min'] = win.min().mean()
-        if 'p95' in stats: results['p95'] = win.quantile(0.95).mean()
-    else:
-        if 'mean' in stats: results['mean'] = series.mean()
-        if 'std' in stats: results['std'] = series.std()
-        if 'max' in stats: results['max'] = series.max()
-        if 'min' in stats: results['min'] = series.min()
-        if 'p95' in stats: results['p95'] = series.quantile(0.95)
-    return results
-
-# Expected feature order (from your model)
-# This list is stored in the feature_names.json file
-feature_names_file = './feature_names.json'
-if os.path.exists(feature_names_file):
-    with open(feature_names_file, 'r') as f:
-        EXPECTED_FEATURES = json.load(f)
-
-print(f"Expected features loaded: {EXPECTED_FEATURES}")
-
-def compute_core_features_from_df(
-    df_pcm: pd.DataFrame,
-    target_cores: List[int] = [3, 4, 5],
-    window_size: int = 2,
-    stats: List[str] = ['mean', 'p95', 'std'],
-    core_prefix_template: str = "Core{core} (Socket 0) - "
-) -> Dict[str, float]:
+    replica_counts = np.asarray(replica_counts, dtype=np.float64)
+    rps_values = np.asarray(rps_values, dtype=np.float64)
+    for node, pcm_features in node_features.items():
+        missing = [f for f in feature_names if f not in pcm_features and f not in MODEL_INPUTS]
+        if missing:
+            raise ValueError(f"Node {node} lacks features {missing}")
+    # Inputs are filled in below; unknown (None/NaN) PCM values take the trees' missing-value branch
+    base = np.array([[pcm_features.get(f, np.nan) for f in feature_names] for pcm_features in node_features.values()],
+                    dtype=np.float64).reshape(len(node_features), len(feature_names))
+    combos = len(rps_values) * len(replica_counts)
+    matrix = np.repeat(base, combos, axis=0)
+    matrix[:, feature_names.index('RPS')] = np.tile(np.repeat(rps_values, len(replica_counts)), len(node_features))
+    matrix[:, feature_names.index('Replicas_x')] = np.tile(replica_counts, len(node_features) * len(rps_values))
+    app.logger.debug(f"Feature matrix {matrix.shape} for nodes {list(node_features)}")
+    return matrix
+
+
+def predict_surface(node_features: Dict[str, Dict[str, float]], replica_counts, rps_values) -> np.ndarray:
     """
-    Computes per-core and AvgCore PCM stats from a single PCM DataFrame.
-
-    Parameters:
-    - df_pcm: DataFrame with time-series PCM metrics
-    - target_cores: cores to analyze (default [3,4,5])
-    - window_size: window for rolling stat calculation
-    - stats: stats to compute (e.g., ['mean','std','p95'])
-    - core_prefix_template: pattern for column prefix
-
-    Returns:
-    - Dict of {feature_name: value}
+    Predicts normalized performance for every (node, RPS, replica count) in a single
+    batched call to the current model version (coalesced with concurrent requests),
+    skipping rows whose quantized features are already cached.
+    Returns an array of shape (nodes, len(rps_values), len(replica_counts)).
     """
-    from collections import defaultdict
-
-    features = {}
-    core_metrics_group = defaultdict(list)
-
-    # Metrics we care about
-    keep_metrics = ['IPC', 'L3MISS', 'L2MISS', 'C0res%', 'C1res%', 'C6res%', 'PhysIPC']
-
-    for core in target_cores:
-        core_prefix = core_prefix_template.format(core=core)
-        core_cols = [col for col in df_pcm.columns if col.startswith(core_prefix)]
-        core_cols = [col for col in core_cols if any(m in col for m in keep_metrics)]
-
-        for col in core_cols:
-            metric = col.replace(core_prefix, '').replace('%', '')
-            clean_name = f'Core{core}_{metric}'
-            series = df_pcm[col]
-
-            stat_values = compute_windowed_stats(series, window_size, stats)
-            for stat, value in stat_values.items():
-                features[f'{stat}_{clean_name}'] = value
-
-            core_metrics_group[metric].append(series)
-
-    # Compute aggregated AvgCore metrics
-    for metric, series_list in core_metrics_group.items():
-        #continue
-        if series_list:
-            df_metric = pd.concat(series_list, axis=1)
-            agg_series = df_metric.mean(axis=1)  # row-wise average
-            agg_stats = compute_windowed_stats(agg_series, window_size, stats)
-            for stat, value in agg_stats.items():
-                features[f'{stat}_AvgCore_{metric}'] = value
+    current = models.current  # One model version for the whole request, even if a reload swaps it meanwhile
+    if current is None:
+        raise Exception("Prediction error: model not loaded")
+    try:
+        with stage_timers.time("matrix_build"):
+            matrix = build_feature_matrix(node_features, replica_counts, rps_values, current.feature_names)
+        with stage_timers.time("inference"):
+            predictions = model_batcher.predict(current, matrix) if len(matrix) else np.empty(0)
+        return predictions.reshape(len(node_features), len(rps_values), len(replica_counts))
+    except Exception as e:
+        app.logger.error(f"Prediction failed: {str(e)}")
+        raise Exception(f"Prediction error: {str(e)}")
 
-    return features
 
-def calculate_features(node_metrics: Dict[str, pd.DataFrame], replicas: int, rps: int) -> Dict[str, List[float]]:
+def warm_up():
     """
-    Uses the shared core feature function to generate feature vectors for each node.
+    Loads the model and runs one dummy batch through it, then reports ready
+    and logs the startup profile.
     """
-    features = {}
-    for node_name, df in node_metrics.items():
-        feature_dict = compute_core_features_from_df(
-            df_pcm=df,
-            target_cores=[3, 4, 5],
-            window_size=10,
-            stats=['mean', 'p95', 'std'],
-            core_prefix_template="Core{core} - "  # matches renamed columns in predictor
-        )
-
-        # Build final feature vector using fixed feature list
-        feature_dict['RPS'] = rps
-        feature_dict['Replicas_x'] = replicas 
-        feature_vector = [feature_dict.get(f, 0.0) for f in EXPECTED_FEATURES]
-        features[node_name] = feature_vector
-        app.logger.debug(f"Length of Features {len(feature_vector)}")
-
-    return features
-
-
-def make_predictions(features: Dict[str, List[float]]) -> Dict[str, float]:
-    """Make predictions using the full pipeline"""
-    predictions = {}
     try:
-        for node_name, feature_vector in features.items():
-            #app.logger.debug(f"Feature vector for {node_name}: {dict(zip(EXPECTED_FEATURES, feature_vector))}")
-            # Construct a DataFrame with proper feature names
-            input_df = pd.DataFrame([feature_vector], columns=EXPECTED_FEATURES)
-            
-            prediction = model.predict(input_df)[0]
-            predictions[node_name] = float(prediction)
-            
-            app.logger.debug(f"{node_name} prediction: {prediction}")
-        return predictions
+        with profile.phase("model load"):
+            models.load()
+        print(f"Expected features loaded: {models.current.feature_names}")
+        with profile.phase("warm-up batch"):
+            unknown = dict.fromkeys(models.current.feature_plan.names, np.nan)
+            predict_surface({node: unknown for node in DEFAULT_TOPOLOGY}, range(1, 5), [1000.0])
+            models.current.cache.clear()  # Dummy rows are not worth keeping
+        readiness["ready"] = True
+        profile.mark_ready()
     except Exception as e:
-        app.logger.error(f"Prediction failed: {str(e)}")
-        raise Exception(f"Prediction error: {str(e)}")
+        readiness["error"] = str(e)
+        print(f"Error loading model: {e}")
+    profile.log("Predictor startup")
+    if MODEL_WATCH:
+        models.start_watcher()
 
+threading.Thread(target=warm_up, daemon=True).start()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # No reloader: its parent process would import this module too, loading a second model,
+    # stream subscriber and watcher that never serve a request (model reloads use the watcher)
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Builds feature_buckets.json, the per-feature bucket widths of the Predictor's
+prediction cache (see prediction_cache.py), from the training dataset.
+
+Usage: python build_feature_buckets.py [dataset.pkl] [model.pkl]
+"""
+import json
+import sys
+
+import joblib
+import pandas as pd
+
+from prediction_cache import bucket_widths, BUCKETS_PATH, BUCKET_STD_FRACTION
+
+DATASET_PATH = '../../Profiling/Data_Analysis_Model_Training/complete_dataset_labeled.pkl'
+MODEL_PATH = './slowdown_predictor.pkl'
+FEATURE_NAMES_PATH = './feature_names.json'
+
+if __name__ == '__main__':
+    dataset_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    model_path = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+
+    dataset = pd.read_pickle(dataset_path)
+    model = joblib.load(model_path)
+    with open(FEATURE_NAMES_PATH, 'r') as f:
+        feature_names = json.load(f)
+
+    buckets = bucket_widths(model, feature_names, dataset)
+    with open(BUCKETS_PATH, 'w') as f:
+        json.dump({"bucket_std_fraction": BUCKET_STD_FRACTION, "dataset": dataset_path, "features": buckets}, f, indent=2)
+
+    for name, bucket in buckets.items():
+        print(f"{name:20s} width={bucket['width']:.6g} ({bucket['source']})")
+    print(f"Wrote {BUCKETS_PATH}")
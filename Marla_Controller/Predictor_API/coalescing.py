@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+import numpy as np
+
+
+class SingleFlight:
+    """
+    Runs one call at a time per key: callers arriving while it is in flight
+    wait for it and share its result (or exception) instead of repeating it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn: Callable):
+        with self.lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.inflight[key]
+        return future.result()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared}
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent model calls into one batched predict.
+
+    The first caller of a batch waits `window` seconds for others, then scores
+    every collected feature matrix in a single call and hands each caller its
+    own rows back. Matrices are grouped by model version, so a reload during
+    the window never mixes feature orders. A window of 0 calls the model directly.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = []  # (model version, matrix, future)
+        self.batches = 0
+        self.requests = 0
+        self.largest = 0
+
+    def predict(self, version, matrix: np.ndarray) -> np.ndarray:
+        if self.window <= 0:
+            return version.predict(matrix)
+        future = Future()
+        with self.lock:
+            self.pending.append((version, matrix, future))
+            leader = len(self.pending) == 1
+        if leader:
+            time.sleep(self.window)
+            with self.lock:
+                batch, self.pending = self.pending, []
+            self._run(batch)
+        return future.result()
+
+    def _run(self, batch: List[tuple]):
+        by_version = {}
+        for version, matrix, future in batch:
+            by_version.setdefault(id(version), (version, []))[1].append((matrix, future))
+        for version, jobs in by_version.values():
+            try:
+                predictions = version.predict(np.concatenate([matrix for matrix, _ in jobs]))
+            except Exception as e:
+                for _, future in jobs:
+                    future.set_exception(e)
+                continue
+            offsets = np.cumsum([len(matrix) for matrix, _ in jobs])[:-1]
+            for (_, future), rows in zip(jobs, np.split(predictions, offsets)):
+                future.set_result(rows)
+            with self.lock:
+                self.batches += 1
+                self.requests += len(jobs)
+                self.largest = max(self.largest, len(jobs))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "window_ms": self.window * 1000,
+                "batches": self.batches,
+                "requests": self.requests,
+                "largest_batch": self.largest,
+            }
@@ -0,0 +1,145 @@
+import re
+import warnings
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# "<stat>_<Core3|AvgCore>_<metric>", e.g. "p95_Core3_IPC" or "std_AvgCore_C0res" (PCM's "C0res%" without the %)
+FEATURE_NAME = re.compile(r'^(mean|std|p95)_(Core\d+|AvgCore)_(.+)$')
+MODEL_INPUTS = ('RPS', 'Replicas_x')  # Supplied with each request rather than computed from PCM
+# Metrics the Metrics API keeps (pcm_reader.DESIRED_KEYWORDS), as they appear in feature names.
+# The "ipc" keyword is a substring match, so PCM's PhysIPC/PhysIPC% columns are kept too.
+COLLECTED_METRICS = ('IPC', 'PhysIPC', 'L2MISS', 'L3MISS', 'READ', 'WRITE', 'C0res', 'C1res', 'C6res')
+
+
+def window_bounds(window: int) -> Tuple[int, int]:
+    """Samples before/after the labelled position in a pandas centered rolling window."""
+    return window // 2, window - 1 - window // 2
+
+
+def _nan_percentile(windows: np.ndarray, q: float) -> np.ndarray:
+    """
+    Linear-interpolation percentile over the last axis, skipping NaN. Same result as
+    np.nanpercentile, but vectorised with one sort (NaN sorts last) instead of a per-window loop.
+    """
+    ordered = np.sort(windows, axis=-1)
+    counts = np.sum(~np.isnan(ordered), axis=-1)
+    rank = (q / 100.0) * np.maximum(counts - 1, 0)
+    lo = np.floor(rank).astype(np.intp)
+    hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+    lower = np.take_along_axis(ordered, lo[..., None], axis=-1)[..., 0]
+    upper = np.take_along_axis(ordered, hi[..., None], axis=-1)[..., 0]
+    return np.where(counts > 0, lower + (upper - lower) * (rank - lo), np.nan)
+
+
+def _window_stat(windows: np.ndarray, stat: str) -> np.ndarray:
+    """One statistic of every (time x series x window) window, reduced over the last axis skipping NaN."""
+    if stat == 'mean':
+        return np.nanmean(windows, axis=-1)
+    if stat == 'std':
+        counts = np.sum(~np.isnan(windows), axis=-1)
+        return np.where(counts > 1, np.nanstd(windows, axis=-1, ddof=1), np.nan)
+    if stat == 'p95':
+        return _nan_percentile(windows, 95)
+    raise ValueError(f"Unsupported statistic {stat}")
+
+
+def rolling_window_stats(values: np.ndarray, window: int, stats: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Per-column averages of centered rolling-window statistics over a (time x series) array.
+
+    Equivalent to pandas' series.rolling(window, center=True, min_periods=1).<stat>().mean()
+    for every column at once: the array is NaN-padded at both ends, viewed as
+    (time x series x window) with sliding_window_view (no copy), and each stat is
+    reduced over the window axis skipping NaN. std needs two valid samples per
+    window, p95 interpolates linearly like pandas.
+    """
+    before, after = window_bounds(window)
+    padded = np.pad(values.astype(np.float64), ((before, after), (0, 0)), constant_values=np.nan)
+    windows = sliding_window_view(padded, window, axis=0)
+    results = {}
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN windows simply give NaN
+        for stat in stats:
+            results[stat] = np.nanmean(_window_stat(windows, stat), axis=0)
+    return results
+
+
+class FeaturePlan:
+    """
+    The PCM features a model needs, resolved once when the model is loaded.
+
+    Every feature name is parsed into (stat, core, metric) and grouped into
+    series (one per core/metric pair), so extraction only reads the columns
+    and computes the statistics the model actually uses. Names that cannot be
+    produced from the metrics the Metrics API collects raise ValueError here,
+    instead of silently becoming 0.0 at prediction time.
+    """
+
+    def __init__(self, feature_names: List[str]):
+        self.names = [name for name in feature_names if name not in MODEL_INPUTS]
+        self.series = []  # (core, metric) pairs, in first-use order
+        self.outputs = []  # (feature name, series position, stat)
+        invalid = []
+        for name in self.names:
+            match = FEATURE_NAME.match(name)
+            if not match or match.group(3) not in COLLECTED_METRICS:
+                invalid.append(name)
+                continue
+            stat, core, metric = match.groups()
+            if (core, metric) not in self.series:
+                self.series.append((core, metric))
+            self.outputs.append((name, self.series.index((core, metric)), stat))
+        if invalid:
+            raise ValueError(f"Cannot compute features {invalid} from the collected PCM metrics {list(COLLECTED_METRICS)}")
+        self.stats = {}  # stat -> series positions it is needed for
+        for _, position, stat in self.outputs:
+            if position not in self.stats.setdefault(stat, []):
+                self.stats[stat].append(position)
+        self._sources = {}  # (columns, cores) -> resolved column indices
+
+    def sources(self, columns: Tuple[str, ...], cores: Tuple[Tuple[str, str], ...]) -> Tuple[Tuple[int, ...], ...]:
+        """
+        Column indices feeding each series for one metrics header and node core
+        mapping ({PCM domain: model core}); AvgCore series use all of the node's
+        cores. Raises ValueError when a series has no column to read from.
+        """
+        key = (columns, cores)
+        if key in self._sources:
+            return self._sources[key]
+        index = {}
+        for i, col in enumerate(columns):
+            if ' - ' in col:
+                domain, metric = col.split(' - ', 1)
+                index[(domain, metric.replace('%', ''))] = i
+        sources, missing = [], []
+        for core, metric in self.series:
+            domains = sorted(domain for domain, mapped in cores if core in ('AvgCore', mapped))
+            found = tuple(index[(d, metric)] for d in domains if (d, metric) in index)
+            if not found:
+                missing.append(f"{core}_{metric}")
+            sources.append(found)
+        if missing:
+            raise ValueError(f"Metrics lack the columns for {missing} (node cores {dict(cores)})")
+        self._sources[key] = tuple(sources)
+        return self._sources[key]
+
+    def extract(self, columns: List[str], values: np.ndarray, cores: Dict[str, str], window: int) -> Dict[str, float]:
+        """
+        Computes the planned features of one node from a (time x metric) array
+        whose columns are the raw Metrics API names (e.g. "Core0 (Socket 0) - IPC").
+        """
+        sources = self.sources(tuple(columns), tuple(sorted(cores.items())))
+        if not len(values):
+            return dict.fromkeys(self.names, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            # AvgCore series are the row-wise mean over their cores, skipping NaN like DataFrame.mean(axis=1)
+            matrix = np.column_stack([values[:, s[0]] if len(s) == 1 else np.nanmean(values[:, list(s)], axis=1) for s in sources])
+
+        computed = {}
+        for stat, positions in self.stats.items():
+            result = rolling_window_stats(matrix[:, positions], window, [stat])[stat]
+            computed.update({(p, stat): v for p, v in zip(positions, result)})
+        return {name: float(computed[(position, stat)]) for name, position, stat in self.outputs}
@@ -0,0 +1,116 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+# Upper bounds (seconds) of the stage latency histograms, +Inf is implicit
+STAGE_BUCKETS_SECONDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DRIFT_WINDOW = 300  # Latest per-node observations of each feature kept for the drift summary
+DRIFT_MIN_SAMPLES = 30  # Observations needed before a feature can be flagged
+DRIFT_OUT_OF_RANGE = 0.25  # Flag a feature when more than this fraction of its values lie outside the trained range
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4"
+
+
+class StageTimers:
+    """
+    Prometheus-style latency histograms per request stage (metrics fetch,
+    feature extraction, matrix build, inference, serialisation).
+    """
+
+    def __init__(self, buckets: tuple = STAGE_BUCKETS_SECONDS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.stages = {}  # stage -> [bucket counts..., +Inf count], sum
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            counts, total = self.stages.get(stage) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.stages[stage] = (counts, total + seconds)
+
+    def prometheus(self, name: str = "predictor_stage_seconds") -> List[str]:
+        lines = [f"# HELP {name} Time spent per request stage.", f"# TYPE {name} histogram"]
+        with self.lock:
+            stages = {stage: (list(counts), total) for stage, (counts, total) in self.stages.items()}
+        for stage, (counts, total) in sorted(stages.items()):
+            cumulative = np.cumsum(counts)
+            for bound, n in zip([str(b) for b in self.buckets] + ["+Inf"], cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {n}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative[-1]}')
+        return lines
+
+
+def trained_ranges(thresholds: Dict[str, np.ndarray]) -> Dict[str, tuple]:
+    """
+    (lowest, highest) split threshold of every feature the model splits on.
+    Beyond them every tree takes the same branch, so values outside this
+    range are extrapolated rather than learned.
+    """
+    return {name: (float(splits[0]), float(splits[-1])) for name, splits in thresholds.items() if len(splits)}
+
+
+class FeatureDrift:
+    """
+    Rolling distribution of the PCM features fed to one model version,
+    compared against the range the model was trained on.
+    """
+
+    def __init__(self, ranges: Dict[str, tuple], window: int = DRIFT_WINDOW):
+        self.ranges = ranges
+        self.lock = threading.Lock()
+        self.values = {name: deque(maxlen=window) for name in ranges}
+
+    def observe(self, node_features: Dict[str, Dict[str, float]]):
+        with self.lock:
+            for features in node_features.values():
+                for name, values in self.values.items():
+                    value = features.get(name)
+                    if value is not None and not np.isnan(value):
+                        values.append(value)
+
+    def summary(self) -> Dict[str, dict]:
+        with self.lock:
+            snapshot = {name: np.fromiter(values, dtype=np.float64) for name, values in self.values.items()}
+        summary = {}
+        for name, values in snapshot.items():
+            low, high = self.ranges[name]
+            if not len(values):
+                summary[name] = {"count": 0, "trained_range": [low, high], "drift": False}
+                continue
+            outside = float(np.mean((values < low) | (values > high)))
+            summary[name] = {
+                "count": len(values),
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "trained_range": [low, high],
+                "out_of_range": round(outside, 4),
+                "drift": len(values) >= DRIFT_MIN_SAMPLES and outside > DRIFT_OUT_OF_RANGE,
+            }
+        return summary
+
+    def prometheus(self) -> List[str]:
+        lines = ["# HELP predictor_feature_out_of_range Fraction of recent feature values outside the trained range.",
+                 "# TYPE predictor_feature_out_of_range gauge"]
+        summary = self.summary()
+        for name, s in summary.items():
+            if s["count"]:
+                lines.append(f'predictor_feature_out_of_range{{feature="{name}"}} {s["out_of_range"]}')
+        lines += ["# HELP predictor_feature_drift 1 when the feature has left the trained regime.",
+                  "# TYPE predictor_feature_drift gauge"]
+        lines += [f'predictor_feature_drift{{feature="{name}"}} {int(s["drift"])}' for name, s in summary.items()]
+        return lines
@@ -0,0 +1,172 @@
+from __future__ import annotations  # Annotations stay unevaluated, so pd.DataFrame does not import pandas
+
+import json
+import threading
+import time
+from collections import deque
+from io import StringIO, BytesIO
+
+import numpy as np
+import requests
+
+from startup import LazyModule
+
+pd = LazyModule("pandas")
+
+NPY_MIMETYPE = "application/x-npy"  # Binary format served by the Metrics API, CSV is the fallback
+LOCAL_WINDOW_ROWS = 40  # Samples the model features are computed over
+REQUEST_CONNECT_TIMEOUT = 5  # seconds
+
+
+def decode_metrics_response(response: requests.Response) -> pd.DataFrame:
+    """Turns a /metrics response (.npy or CSV) into a DataFrame. Empty bodies give an empty frame."""
+    if response.headers.get("Content-Type", "").startswith(NPY_MIMETYPE):
+        # Structured array: one field per column, no text parsing needed
+        return pd.DataFrame(np.load(BytesIO(response.content), allow_pickle=False))
+    # Convert CSV response to DataFrame (older Metrics API versions)
+    csv_data = response.content.decode('utf-8')
+    if not csv_data.strip():
+        return pd.DataFrame()
+    return pd.read_csv(StringIO(csv_data))
+
+
+class MetricsWindow:
+    """
+    Local copy of the latest Metrics API samples, kept up to date with
+    /metrics?since=<seq> deltas so each poll only transfers new rows.
+
+    The full window is re-fetched when the server's columns change, when
+    its sequence numbers go backwards (restart) or when the delta does not
+    connect to what we already hold.
+    """
+
+    def __init__(self, url: str, timeout: float, max_rows: int = LOCAL_WINDOW_ROWS):
+        self.url = url
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self.frame = None  # DataFrame of the latest samples, set by the first refresh()
+        self.last_seq = None
+        self.lock = threading.Lock()
+
+    def _get(self, since: int = None) -> tuple[pd.DataFrame, int]:
+        params = {"since": since} if since is not None else {}
+        headers = {"Accept": f"{NPY_MIMETYPE}, text/csv;q=0.5"}
+        response = requests.get(self.url, params=params, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        server_seq = response.headers.get("X-Metrics-Seq")
+        return decode_metrics_response(response), int(server_seq) if server_seq is not None else None
+
+    def _merge(self, delta: pd.DataFrame) -> bool:
+        """Appends a delta to the local window. Returns False when a full re-fetch is needed."""
+        if delta.empty:
+            return True
+        if list(delta.columns) != list(self.frame.columns) or delta["Seq"].iloc[0] != self.last_seq + 1:
+            return False
+        self.frame = pd.concat([self.frame, delta], ignore_index=True).iloc[-self.max_rows:].reset_index(drop=True)
+        return True
+
+    def refresh(self) -> pd.DataFrame:
+        """Brings the local window up to date and returns it."""
+        with self.lock:
+            if self.last_seq is not None:
+                delta, server_seq = self._get(since=self.last_seq)
+                if server_seq is not None and server_seq >= self.last_seq and self._merge(delta):
+                    # Advance by the rows actually merged, never past them
+                    if not delta.empty:
+                        self.last_seq = int(delta["Seq"].iloc[-1])
+                    return self.frame
+
+            # First call, server without sequence numbers, restart or column change
+            frame, server_seq = self._get()
+            self.frame = frame.iloc[-self.max_rows:].reset_index(drop=True)
+            if "Seq" not in frame.columns:
+                self.last_seq = None
+            else:
+                self.last_seq = int(frame["Seq"].iloc[-1]) if not frame.empty else server_seq
+            return self.frame
+
+
+class MetricsSubscriber:
+    """
+    Background subscriber to the Metrics API /stream endpoint (server-sent events).
+
+    Keeps a hot local window of the latest samples so /predict can read
+    metrics without any network I/O. Reconnects with ?since=<last seq>
+    after errors, and resets the window when the server's columns change
+    or its sequence numbers go backwards (restart).
+    """
+
+    def __init__(self, url: str, max_rows: int = LOCAL_WINDOW_ROWS, stale_after: float = 5.0,
+                 read_timeout: float = 30.0, reconnect_delay: float = 2.0):
+        self.url = url
+        self.max_rows = max_rows
+        self.stale_after = stale_after
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+        self.columns = []
+        self.rows = deque(maxlen=max_rows)
+        self.last_seq = None
+        self.last_received = 0.0
+        self.connected = False
+        self.lock = threading.Lock()
+        self._values = None  # Array built from `rows`, cached until the next sample
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def is_fresh(self, min_rows: int = 1) -> bool:
+        """True when at least `min_rows` samples are held (e.g. a full feature window) and one arrived recently."""
+        return len(self.rows) >= min_rows and time.time() - self.last_received < self.stale_after
+
+    def window(self) -> tuple[list[str], int, np.ndarray]:
+        """(metric columns, newest seq, time x metric array) of the latest samples."""
+        with self.lock:
+            if self._values is None:
+                self._values = np.array([row[2:] for row in self.rows], dtype=np.float64).reshape(len(self.rows), len(self.columns))
+            return self.columns, self.last_seq, self._values
+
+    def _on_event(self, event: str, data: str):
+        payload = json.loads(data)
+        with self.lock:
+            if event == "columns":
+                if payload != self.columns:
+                    self.columns = payload
+                    self.rows.clear()
+                    self._values = None
+            elif event == "sample":
+                if self.last_seq is not None and payload["seq"] <= self.last_seq:
+                    self.rows.clear()  # Server restarted, its sequence numbers start over
+                self.rows.append([payload["seq"], payload["timestamp"]] + payload["values"])
+                self.last_seq = payload["seq"]
+                self.last_received = time.time()
+                self._values = None
+
+    def _listen(self):
+        params = {"since": self.last_seq} if self.last_seq is not None else {}
+        with requests.get(self.url, params=params, stream=True, timeout=(REQUEST_CONNECT_TIMEOUT, self.read_timeout)) as response:
+            response.raise_for_status()
+            self.connected = True
+            event, data = "message", []
+            for line in response.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+                if line == "":
+                    if data:
+                        self._on_event(event, "\n".join(data))
+                    event, data = "message", []
+                elif line.startswith(":"):
+                    continue  # keep-alive comment
+                elif line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"[metrics_client] Stream from {self.url} interrupted: {e}")
+            self.connected = False
+            time.sleep(self.reconnect_delay)
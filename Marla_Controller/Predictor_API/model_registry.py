@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import List
+
+import numpy as np
+
+from feature_kernel import FeaturePlan
+from instrumentation import FeatureDrift, trained_ranges
+from prediction_cache import PredictionCache, load_bucket_widths, split_thresholds
+from startup import LazyModule
+from tree_compiler import compile_model
+
+joblib = LazyModule("joblib")  # Unpickling the model imports xgboost, which is the slow part of startup
+
+MODEL_HISTORY = 3  # Previous model versions kept in memory for rollback
+MODEL_WATCH_INTERVAL = 5  # seconds between mtime checks of the model files
+CANARY_ROWS = 256
+
+
+def canary_batch(model, feature_names: List[str], rows: int = CANARY_ROWS, seed: int = 0) -> np.ndarray:
+    """Feature rows drawn from the model's own split thresholds, so the canary reaches real leaves."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, len(feature_names)))
+    for f, splits in enumerate(split_thresholds(model, feature_names).values()):
+        if len(splits):
+            X[:, f] = rng.choice(splits, size=rows)
+    return X
+
+
+class ModelVersion:
+    """A loaded model with everything derived from it: feature order, compiled trees and prediction cache."""
+
+    def __init__(self, version: int, model, feature_names: List[str], mtimes: tuple, compiled: bool = True):
+        self.version = version
+        self.model = model
+        self.feature_names = feature_names
+        self.mtimes = mtimes
+        self.loaded_at = time.time()
+        self.use_compiled = compiled
+        self.compiled = None
+        self.feature_plan = None
+        self.drift = None
+        self.cache = PredictionCache(load_bucket_widths(model, feature_names))
+
+    def predict(self, matrix: np.ndarray) -> np.ndarray:
+        predict_fn = self.compiled.predict if self.compiled is not None else self.model.predict
+        return self.cache.predict(matrix, predict_fn)
+
+    def validate(self):
+        """
+        Raises when the model does not fit the feature list, a feature cannot be
+        computed from the collected metrics or the canary batch predicts non-finite
+        values. Compiles the trees once the feature list checks out.
+        """
+        expected = getattr(self.model, 'n_features_in_', len(self.feature_names))
+        if expected != len(self.feature_names):
+            raise ValueError(f"Model expects {expected} features, feature list has {len(self.feature_names)}")
+        for name in ('RPS', 'Replicas_x'):
+            if name not in self.feature_names:
+                raise ValueError(f"Feature list lacks {name}")
+        self.feature_plan = FeaturePlan(self.feature_names)
+        thresholds = split_thresholds(self.model, self.feature_names)
+        self.drift = FeatureDrift(trained_ranges({name: thresholds[name] for name in self.feature_plan.names}))
+        if self.use_compiled:
+            self.compiled = compile_model(self.model, self.feature_names)
+        predictions = self.predict(canary_batch(self.model, self.feature_names))
+        if predictions.shape != (CANARY_ROWS,) or not np.all(np.isfinite(predictions)):
+            raise ValueError("Canary predictions are not finite")
+        self.cache.clear()  # Canary rows are not worth keeping
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "n_features": len(self.feature_names),
+            "inference": "compiled" if self.compiled is not None else "xgboost",
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the model version used for predictions and swaps in new ones without downtime.
+
+    A new model (and feature_names.json) is loaded and validated on a canary
+    batch while the current version keeps serving; it then replaces it in a
+    single reference assignment. Requests grab `current` once, so each one is
+    scored entirely by one version. The last MODEL_HISTORY versions stay in
+    memory, warm caches included, for instant rollback.
+    """
+
+    def __init__(self, model_path: str, feature_names_path: str, compiled: bool = True, history: int = MODEL_HISTORY):
+        self.model_path = model_path
+        self.feature_names_path = feature_names_path
+        self.compiled = compiled
+        self.current = None
+        self.previous = deque(maxlen=history)
+        self.next_version = 1
+        self.lock = threading.Lock()  # One load at a time
+        self.last_error = None
+
+    def _mtimes(self) -> tuple:
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in (self.model_path, self.feature_names_path))
+
+    def load(self) -> ModelVersion:
+        """Loads, validates and activates the model files. The current version keeps serving if anything fails."""
+        with self.lock:
+            try:
+                mtimes = self._mtimes()
+                model = joblib.load(self.model_path)
+                with open(self.feature_names_path, 'r') as f:
+                    feature_names = json.load(f)
+                candidate = ModelVersion(self.next_version, model, feature_names, mtimes, self.compiled)
+                candidate.validate()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Model load failed, keeping version {self.current.version if self.current else None}: {self.last_error}")
+                raise
+            self.next_version += 1
+            self._activate(candidate)
+            self.last_error = None
+            print(f"Model version {candidate.version} active ({len(feature_names)} features)")
+            return candidate
+
+    def _activate(self, version: ModelVersion):
+        if self.current is not None:
+            self.previous.append(self.current)
+        self.current = version
+
+    def rollback(self, version: int = None) -> ModelVersion:
+        """Re-activates the given previous version (the latest one by default)."""
+        with self.lock:
+            candidates = [v for v in self.previous if version is None or v.version == version]
+            if not candidates:
+                raise KeyError(f"No previous model version {version if version is not None else ''}".strip())
+            target = candidates[-1]
+            self.previous.remove(target)
+            self._activate(target)
+            print(f"Rolled back to model version {target.version}")
+            return target
+
+    def watch(self, interval: float = MODEL_WATCH_INTERVAL):
+        """Reloads whenever the model or feature list file changes on disk."""
+        seen = self.current.mtimes if self.current else self._mtimes()
+        while True:
+            time.sleep(interval)
+            mtimes = self._mtimes()
+            if mtimes == seen or None in mtimes:
+                continue
+            seen = mtimes
+            try:
+                self.load()
+            except Exception:
+                pass  # Reported by load(), retried on the next change
+
+    def start_watcher(self, interval: float = MODEL_WATCH_INTERVAL):
+        threading.Thread(target=self.watch, args=(interval,), daemon=True).start()
+        return self
+
+    def describe(self) -> dict:
+        return {
+            "current": self.current.describe() if self.current else None,
+            "previous": [v.describe() for v in self.previous],
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BUCKETS_PATH = './feature_buckets.json'
+BUCKET_STD_FRACTION = 0.05  # Bucket width as a fraction of each feature's spread in the training data
+PREDICTION_CACHE_ENTRIES = 4096  # Cached (quantized feature vector -> NP) rows
+PREDICTION_CACHE_TTL = 300  # seconds
+# Training dataset columns that hold model features under another name
+DATASET_COLUMNS = {'RPS': 'Given_RPS', 'Replicas_x': 'Replicas'}
+
+
+def split_thresholds(model, feature_names: List[str]) -> Dict[str, np.ndarray]:
+    """Sorted unique split thresholds of every feature used by the model's trees."""
+    trees = model.get_booster().trees_to_dataframe()
+    splits = trees[trees['Feature'] != 'Leaf']
+    by_name = {name: np.sort(group['Split'].unique()) for name, group in splits.groupby('Feature')}
+    # Boosters trained without feature names refer to features as f0, f1, ...
+    return {name: by_name.get(name, by_name.get(f'f{i}', np.empty(0))) for i, name in enumerate(feature_names)}
+
+
+def bucket_widths(model, feature_names: List[str], dataset=None, fraction: float = BUCKET_STD_FRACTION) -> Dict[str, dict]:
+    """
+    Per-feature bucket widths: `fraction` of the feature's standard deviation in
+    the training dataset. Features missing from the dataset fall back to the spread
+    of the model's split thresholds, which follow the training data's quantiles.
+    Features the model never splits on get width 0 (exact match).
+    """
+    thresholds = split_thresholds(model, feature_names)
+    buckets = {}
+    for name in feature_names:
+        column = DATASET_COLUMNS.get(name, name)
+        if dataset is not None and column in dataset.columns:
+            std, source = float(dataset[column].std()), f'dataset:{column}'
+        elif len(thresholds[name]) > 1:
+            std, source = float(np.std(thresholds[name])), 'model_splits'
+        else:
+            std, source = 0.0, 'exact'
+        buckets[name] = {'width': std * fraction, 'source': source}
+    return buckets
+
+
+def load_bucket_widths(model, feature_names: List[str], path: str = BUCKETS_PATH) -> np.ndarray:
+    """Bucket widths in feature order, from `path` (see build_feature_buckets.py) or derived from the model."""
+    buckets = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            buckets = json.load(f)['features']
+    missing = [name for name in feature_names if name not in buckets]
+    if missing:
+        buckets.update(bucket_widths(model, missing))
+    return np.array([buckets[name]['width'] for name in feature_names], dtype=np.float64)
+
+
+class PredictionCache:
+    """
+    Memoizes model predictions per quantized feature vector.
+
+    Each feature is bucketed as floor(value / width) (NaN keeps its own bucket,
+    width 0 means exact match), so feature vectors that differ by less than a
+    bucket reuse the prediction of the first one seen. Entries expire after
+    `ttl` seconds and the least recently used ones are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(self, widths: np.ndarray, max_entries: int = PREDICTION_CACHE_ENTRIES, ttl: float = PREDICTION_CACHE_TTL):
+        self.widths = np.asarray(widths, dtype=np.float64)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, prediction)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def keys(self, matrix: np.ndarray) -> List[bytes]:
+        exact = self.widths <= 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            buckets = np.where(exact, matrix, np.floor(matrix / np.where(exact, 1.0, self.widths)))
+        # NaN and +-inf are kept as they are, float bit patterns make them distinct keys
+        return [row.tobytes() for row in buckets]
+
+    def predict(self, matrix: np.ndarray, predict_fn: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Predictions for every row of `matrix`, calling `predict_fn` once on the rows not cached."""
+        keys = self.keys(matrix)
+        predictions = np.empty(len(keys), dtype=np.float64)
+        now = time.time()
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self.entries.move_to_end(key)
+                    predictions[i] = entry[1]
+                else:
+                    missing.append(i)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            predictions[missing] = predict_fn(matrix[missing])
+            with self.lock:
+                for i in missing:
+                    self.entries[keys[i]] = (now + self.ttl, float(predictions[i]))
+                    self.entries.move_to_end(keys[i])
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return predictions
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl,
+            }
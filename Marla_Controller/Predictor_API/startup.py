@@ -0,0 +1,68 @@
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Wall-clock breakdown of the service's start: module imports, model load and warm-up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.ready_after = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self.lock:
+            self.phases[name] = round(seconds * 1000, 1)
+
+    def mark_ready(self):
+        self.ready_after = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {"phases_ms": dict(self.phases), "ready_after_ms": self.ready_after}
+
+    def log(self, title: str):
+        phases = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.summary()["phases_ms"].items())
+        print(f"{title}: {phases}")
+
+
+profile = StartupProfile()
+
+
+def timed_import(name: str):
+    """Imports a module, recording how long the import took in the startup profile."""
+    with profile.phase(f"import {name}"):
+        return importlib.import_module(name)
+
+
+class LazyModule:
+    """
+    Stands in for a module that is only imported on first attribute access,
+    so services start answering before heavy libraries (pandas) are loaded.
+    The import time is recorded in the startup profile when it happens.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = timed_import(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
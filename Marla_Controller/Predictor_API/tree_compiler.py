@@ -0,0 +1,135 @@
+import json
+from typing import List
+
+import numpy as np
+
+VALIDATION_ROWS = 512  # Canary rows compared against the original model before the fast path is used
+VALIDATION_TOLERANCE = 1e-5
+
+
+class CompiledTreeEnsemble:
+    """
+    Array-based copy of an XGBoost regression booster for fast inference.
+
+    Every tree is flattened into rows of padded (n_trees, max_nodes) arrays:
+    split feature index, float32 threshold, yes/no/missing child and leaf
+    value. predict() walks all trees for all rows at once, one tree level
+    per step, with the same semantics as XGBoost: go to `yes` when
+    x < threshold (compared in float32), to `missing` when x is NaN.
+    The prediction is base_score plus the sum of the reached leaves.
+    """
+
+    def __init__(self, model, feature_names: List[str]):
+        booster = model.get_booster()
+        config = json.loads(booster.save_config())
+        objective = config["learner"]["objective"]["name"]
+        if objective != "reg:squarederror":
+            raise ValueError(f"Unsupported objective {objective}")
+        # Newer XGBoost versions store base_score as a vector string, e.g. "[5.269537E-1]"
+        self.base_score = float(np.ravel(json.loads(config["learner"]["learner_model_param"]["base_score"]))[0])
+
+        trees = [json.loads(tree) for tree in booster.get_dump(dump_format="json")]
+        best_iteration = getattr(model, "best_iteration", None) if hasattr(model, "best_iteration") else None
+        if best_iteration is not None:
+            trees = trees[:best_iteration + 1]  # XGBRegressor.predict stops at the best iteration too
+
+        index = {name: i for i, name in enumerate(feature_names)}
+        flat = [self._flatten(tree) for tree in trees]
+        max_nodes = max(len(nodes) for nodes in flat)
+        shape = (len(flat), max_nodes)
+        self.feature = np.zeros(shape, dtype=np.intp)
+        self.threshold = np.zeros(shape, dtype=np.float32)
+        self.yes = np.zeros(shape, dtype=np.intp)
+        self.no = np.zeros(shape, dtype=np.intp)
+        self.missing = np.zeros(shape, dtype=np.intp)
+        self.is_leaf = np.ones(shape, dtype=bool)
+        self.leaf = np.zeros(shape, dtype=np.float64)
+        self.depth = 0
+        for t, nodes in enumerate(flat):
+            for node in nodes.values():
+                i = node["nodeid"]
+                if "leaf" in node:
+                    self.leaf[t, i] = node["leaf"]
+                    self.yes[t, i] = self.no[t, i] = self.missing[t, i] = i
+                    continue
+                split = node["split"]
+                self.feature[t, i] = index[split] if split in index else int(split.lstrip("f"))
+                self.threshold[t, i] = np.float32(node["split_condition"])
+                self.yes[t, i], self.no[t, i], self.missing[t, i] = node["yes"], node["no"], node["missing"]
+                self.is_leaf[t, i] = False
+                self.depth = max(self.depth, node["depth"] + 1)
+        self.n_trees = len(flat)
+        # 1-D views with children as global node indices, so each level is a few flat takes
+        offsets = (np.arange(self.n_trees) * max_nodes)[:, None]
+        self.roots = offsets.ravel()
+        self.flat_feature = self.feature.ravel()
+        self.flat_threshold = self.threshold.ravel()
+        self.flat_yes = (self.yes + offsets).ravel()
+        self.flat_no = (self.no + offsets).ravel()
+        self.flat_missing = (self.missing + offsets).ravel()
+        self.flat_leaf = self.leaf.ravel()
+
+    @staticmethod
+    def _flatten(tree: dict) -> dict:
+        """{nodeid: node} for every node of one JSON-dumped tree."""
+        nodes, stack = {}, [tree]
+        while stack:
+            node = stack.pop()
+            nodes[node["nodeid"]] = node
+            stack.extend(node.get("children", []))
+        return nodes
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        n_features = X.shape[1]
+        row_offsets = (np.arange(len(X)) * n_features)[:, None]
+        values = X.ravel()
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            value = values[row_offsets + self.flat_feature[node]]
+            child = np.where(value < self.flat_threshold[node], self.flat_yes[node], self.flat_no[node])
+            node = np.where(np.isnan(value), self.flat_missing[node], child)
+        return self.base_score + self.flat_leaf[node].sum(axis=1)
+
+    def canary_batch(self, n_features: int, rows: int = VALIDATION_ROWS, seed: int = 0) -> np.ndarray:
+        """
+        Random feature rows that exercise the trees' decisions: values are drawn
+        at, just below and just above the model's own split thresholds, with
+        some NaN, so every comparison edge case is checked.
+        """
+        rng = np.random.default_rng(seed)
+        X = rng.normal(size=(rows, n_features)).astype(np.float32)
+        internal = ~self.is_leaf
+        for f in range(n_features):
+            splits = self.threshold[internal & (self.feature == f)]
+            if len(splits):
+                picks = rng.choice(splits, size=rows)
+                nudge = rng.choice([-1, 0, 1], size=rows)
+                X[:, f] = np.where(nudge < 0, np.nextafter(picks, -np.inf), np.where(nudge > 0, np.nextafter(picks, np.inf), picks))
+        X[rng.random(X.shape) < 0.05] = np.nan
+        return X
+
+    def validate(self, model, n_features: int) -> float:
+        """Largest absolute difference from model.predict on the canary batch."""
+        X = self.canary_batch(n_features)
+        return float(np.max(np.abs(self.predict(X) - model.predict(X))))
+
+
+def compile_model(model, feature_names: List[str]):
+    """
+    Returns a validated CompiledTreeEnsemble for the model, or None (with the
+    reason printed) when it cannot be compiled or does not match the model.
+    """
+    try:
+        compiled = CompiledTreeEnsemble(model, feature_names)
+        error = compiled.validate(model, len(feature_names))
+    except Exception as e:
+        print(f"Compiled inference disabled: {e}")
+        return None
+    if not error <= VALIDATION_TOLERANCE:
+        print(f"Compiled inference disabled: max difference {error:.3g} from the model exceeds {VALIDATION_TOLERANCE}")
+        return None
+    print(f"Compiled inference enabled: {compiled.n_trees} trees, depth {compiled.depth}, max difference {error:.3g}")
+    return compiled
@@ -1,84 +1,381 @@
-import json
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
 from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from scipy.stats import norm
 import numpy as np
+from rps_source import make_rps_source
+
+ARIMA_ORDER = (2, 1, 1)
+MIN_HISTORY = 10  # Observations needed before the first fit
+REFIT_EVERY = 15  # Observations appended to the fitted state between full refits
+FIT_WINDOW = 240  # Latest observations a refit uses, so its cost does not grow with the experiment
+DRIFT_SIGMA = 3.0  # Refit early when a one-step forecast error exceeds this many residual std
+OBSERVATION_POLL_SEC = 0.5  # How often the RPS source is checked while waiting for a new observation
+
+# Forecaster bank
+BANK_MODELS = ("arima", "holt_winters", "gbr_lags", "ewma", "last_value")  # Also the preference order before errors are known
+POOLED_MODELS = ("holt_winters", "gbr_lags")  # Refitted from scratch every cycle, in worker processes
+BANK_PROCESSES = 2
+FORECAST_HORIZON = 3  # Steps (minutes) forecast every cycle
+ERROR_WINDOW = 20  # Latest forecast errors per (model, horizon), used to pick the best model and for its intervals
+MIN_SCORED = 3  # Errors a model needs at a horizon before it can be picked on them
+MIN_INTERVAL_ERRORS = 10  # Errors a model needs at a horizon before its quantiles come from them
+MODEL_TIMEOUT_SEC = 10  # A pooled model slower than this is skipped for the cycle
+EWMA_ALPHA = 0.5
+HW_SEASONAL_PERIOD = None  # Minutes per season of the load pattern; None fits Holt's damped trend only
+GBR_LAGS = 6  # Previous observations used as features by the gradient-boosted regressor
+FALLBACK_RPS = 1000  # Only used before the first observation
+
+
+class ArimaForecaster:
+    """
+    ARIMA forecaster of the observed RPS that is updated, not retrained, every minute.
+
+    New observations are appended to the fitted state-space model with
+    results.extend() (a Kalman filter step, the parameters stay fixed). The
+    parameters are re-estimated on the latest FIT_WINDOW observations,
+    warm-started from the current ones, every REFIT_EVERY observations or as
+    soon as a one-step forecast error exceeds DRIFT_SIGMA residual standard deviations.
+    """
+
+    def __init__(self, order: tuple = ARIMA_ORDER, refit_every: int = REFIT_EVERY,
+                 fit_window: int = FIT_WINDOW, drift_sigma: float = DRIFT_SIGMA):
+        self.order = order
+        self.refit_every = refit_every
+        self.fit_window = fit_window
+        self.drift_sigma = drift_sigma
+        self.history = []
+        self.results = None
+        self.since_fit = 0
+        self.fits = 0
+        self.last_fit_reason = None
+
+    def observe(self, values: list[float]):
+        self.history.extend(values)
+        del self.history[:-self.fit_window]
+        if self.results is None:
+            if len(self.history) >= MIN_HISTORY:
+                self.fit("initial")
+            return
+        drift = self._drifted(values)
+        self.results = self.results.extend(np.asarray(values, dtype=np.float64))
+        self.since_fit += len(values)
+        if drift:
+            self.fit("drift")
+        elif self.since_fit >= self.refit_every:
+            self.fit("scheduled")
+
+    def _drifted(self, values: list[float]) -> bool:
+        """True when a new observation lies further than drift_sigma from its one-step forecast."""
+        sigma = float(np.sqrt(self.results.params[-1]))  # sigma2 is the last ARIMA parameter
+        forecasts = self.results.forecast(steps=len(values))
+        return bool(np.any(np.abs(np.asarray(values) - np.asarray(forecasts)) > self.drift_sigma * sigma))
+
+    def fit(self, reason: str):
+        series = np.array(self.history, dtype=np.float64)
+        start_params = self.results.params if self.results is not None else None
+        try:
+            self.results = ARIMA(series, order=self.order).fit(start_params=start_params)
+        except Exception as e:
+            print(f"❌ Failed to train ARIMA model: {e}")
+            return
+        self.since_fit = 0
+        self.fits += 1
+        self.last_fit_reason = reason
+        print(f"✅ ARIMA model trained ({reason}, {len(series)} observations) at {datetime.now(timezone.utc).isoformat()}.")
+
+    def forecast(self, steps: int = 1) -> np.ndarray:
+        return np.asarray(self.results.forecast(steps=steps))
+
+    def forecast_with_std(self, steps: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Mean forecast and its standard error, the Gaussian prediction interval behind get_forecast().conf_int()."""
+        prediction = self.results.get_forecast(steps=steps)
+        return np.asarray(prediction.predicted_mean), np.asarray(prediction.se_mean)
+
+
+# Forecast functions of the bank's other models: (history, steps) -> forecasts, refitted on every call.
+# Module-level so they can run in the bank's worker processes.
+def last_value_forecast(history: np.ndarray, steps: int) -> np.ndarray:
+    return np.full(steps, history[-1])
+
+
+def ewma_forecast(history: np.ndarray, steps: int, alpha: float = EWMA_ALPHA) -> np.ndarray:
+    level = history[0]
+    for value in history[1:]:
+        level = alpha * value + (1 - alpha) * level
+    return np.full(steps, level)
+
+
+def holt_winters_forecast(history: np.ndarray, steps: int) -> np.ndarray:
+    seasonal = HW_SEASONAL_PERIOD is not None and len(history) >= 2 * HW_SEASONAL_PERIOD
+    model = ExponentialSmoothing(history, trend="add", damped_trend=True,
+                                 seasonal="add" if seasonal else None,
+                                 seasonal_periods=HW_SEASONAL_PERIOD if seasonal else None)
+    return np.asarray(model.fit().forecast(steps))
+
+
+def gbr_lags_forecast(history: np.ndarray, steps: int, lags: int = GBR_LAGS) -> np.ndarray:
+    """Gradient-boosted regression of the next change in RPS on the previous `lags` changes, applied recursively."""
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    diffs = np.diff(history)
+    if len(diffs) < lags + MIN_HISTORY:
+        raise ValueError(f"needs {lags + MIN_HISTORY + 1} observations")
+    X = np.lib.stride_tricks.sliding_window_view(diffs[:-1], lags)
+    y = diffs[lags:]
+    model = GradientBoostingRegressor(n_estimators=50, max_depth=2, learning_rate=0.1).fit(X, y)
+    window, level, forecasts = list(diffs[-lags:]), history[-1], []
+    for _ in range(steps):
+        change = float(model.predict(np.array([window]))[0])
+        level += change
+        forecasts.append(level)
+        window = window[1:] + [change]
+    return np.array(forecasts)
+
+
+FORECAST_FUNCTIONS = {
+    "holt_winters": holt_winters_forecast,
+    "gbr_lags": gbr_lags_forecast,
+    "ewma": ewma_forecast,
+    "last_value": last_value_forecast,
+}
+
+
+class ForecasterBank:
+    """
+    Several RPS forecasters run side by side on the observed RPS, each picked
+    per horizon by its recent accuracy.
+
+    On every new observation each model forecasts FORECAST_HORIZON steps: the
+    incremental ARIMA in-process, the models that refit from scratch
+    (POOLED_MODELS) in a process pool, the cheap ones inline. Each forecast is
+    scored against the observations as they arrive, keeping the last
+    ERROR_WINDOW errors per (model, horizon). forecast() uses, for each
+    horizon, the model with the lowest mean absolute error. A model that fails
+    or times out is simply left out of that cycle. The last observed value is
+    the fallback when no model has a forecast.
+
+    forecast(quantile=q) returns upper (or lower) quantiles instead of point
+    forecasts: the point forecast plus the q-quantile of the model's recent
+    errors at that horizon. Until enough errors are scored, the width of
+    ARIMA's Gaussian prediction interval is used instead.
+    """
+
+    def __init__(self, source, horizon: int = FORECAST_HORIZON, models: tuple = BANK_MODELS):
+        self.source = source
+        self.horizon = horizon
+        self.models = models
+        self.pool = None
+        self.reset()
+
+    def reset(self):
+        self.history = []
+        self.count = 0  # Observations seen, i.e. the index of the next one
+        self.last_timestamp = None
+        self.arima = ArimaForecaster()
+        self.forecasts = {}  # model -> forecasts for the next `horizon` observations
+        self.forecast_std = {}  # model -> standard error of its forecasts, for models that provide one
+        self.pending = deque()  # (index of the first forecast observation, forecasts), awaiting their observations
+        self.errors = {(model, h): deque(maxlen=ERROR_WINDOW) for model in self.models for h in range(1, self.horizon + 1)}
+
+    def poll(self) -> int:
+        """Reads new observations from the RPS source and updates every model. Returns how many arrived."""
+        observations = self.source.read()
+        if self.source.restarted:
+            print("⚠️ RPS source restarted, starting a new history.")
+            self.reset()
+        values = [rps for _, rps in observations]
+        if observations:
+            self.last_timestamp = observations[-1][0]
+            self.observe(values)
+        return len(values)
+
+    def wait_for_observation(self, timeout: float, interval: float = OBSERVATION_POLL_SEC) -> int:
+        """
+        Blocks until new observations arrive (checking the source every `interval`
+        seconds) or `timeout` elapses. Returns how many arrived, 0 on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            arrived = self.poll()
+            remaining = deadline - time.monotonic()
+            if arrived or remaining <= 0:
+                return arrived
+            time.sleep(min(interval, remaining))
+
+    def observe(self, values: list[float]):
+        for value in values:
+            self._score(value)
+            self.count += 1
+        self.history.extend(values)
+        del self.history[:-FIT_WINDOW]
+        if "arima" in self.models:
+            self.arima.observe(values)
+        self.forecasts = self._forecast_all()
+        self.pending.append((self.count, self.forecasts))
+
+    def _score(self, value: float):
+        """Records every pending forecast's error for the observation with index self.count."""
+        while self.pending and self.pending[0][0] + self.horizon <= self.count:
+            self.pending.popleft()
+        for origin, forecasts in self.pending:
+            h = self.count - origin + 1
+            for model, predicted in forecasts.items():
+                self.errors[(model, h)].append(value - predicted[h - 1])
+
+    def _forecast_all(self) -> dict:
+        history = np.array(self.history, dtype=np.float64)
+        if len(history) < MIN_HISTORY:
+            return {}
+        pooled = [m for m in self.models if m in POOLED_MODELS]
+        if pooled and self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=BANK_PROCESSES)
+        futures = {m: self.pool.submit(FORECAST_FUNCTIONS[m], history, self.horizon) for m in pooled}
+        forecasts = {}
+        recycle = False  # Set when the pool is broken or a worker is stuck on a timed-out forecast
+        for model in self.models:
+            try:
+                if model in futures:
+                    predicted = futures[model].result(timeout=MODEL_TIMEOUT_SEC)
+                elif model == "arima":
+                    if self.arima.results is None:
+                        continue
+                    predicted, self.forecast_std[model] = self.arima.forecast_with_std(self.horizon)
+                else:
+                    predicted = FORECAST_FUNCTIONS[model](history, self.horizon)
+            except BrokenProcessPool as e:
+                print(f"⚠️ Forecaster {model} skipped this cycle: {type(e).__name__}: {e}")
+                recycle = True
+                continue
+            except TimeoutError:
+                print(f"⚠️ Forecaster {model} skipped this cycle: no forecast after {MODEL_TIMEOUT_SEC}s")
+                if not futures[model].cancel():
+                    recycle = True  # Already running: its worker would delay the next cycles' forecasts
+                continue
+            except Exception as e:
+                print(f"⚠️ Forecaster {model} skipped this cycle: {type(e).__name__}: {e}")
+                continue
+            predicted = np.asarray(predicted, dtype=np.float64)
+            if predicted.shape == (self.horizon,) and np.all(np.isfinite(predicted)):
+                forecasts[model] = predicted
+        if recycle:
+            self._recycle_pool()
+        return forecasts
+
+    def _recycle_pool(self):
+        """Drops the process pool, cancelling its queued forecasts and stopping its workers. Recreated on the next cycle."""
+        pool, self.pool = self.pool, None
+        processes = list((pool._processes or {}).values())  # A busy worker can only be stopped through the private process map
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def mean_errors(self, h: int) -> dict:
+        """Mean absolute error at horizon h of each model with at least MIN_SCORED scored forecasts."""
+        return {model: float(np.mean(np.abs(self.errors[(model, h)]))) for model in self.models
+                if len(self.errors[(model, h)]) >= MIN_SCORED}
+
+    def best_model(self, h: int):
+        """The available model with the lowest recent error at horizon h (by preference order until scored)."""
+        available = [m for m in self.models if m in self.forecasts]
+        if not available:
+            return None
+        errors = self.mean_errors(h)
+        scored = [m for m in available if m in errors]
+        return min(scored, key=errors.get) if scored else available[0]
+
+    def forecast(self, steps: int = 1, quantile: float = None) -> list[tuple[float, str]]:
+        """(forecast, model used) for the next `steps` observations, steps <= horizon; the given quantile if any."""
+        result = []
+        for h in range(1, min(steps, self.horizon) + 1):
+            model = self.best_model(h)
+            if model is not None:
+                point = float(self.forecasts[model][h - 1])
+                result.append((point + self._quantile_offset(model, h, quantile), model))
+            elif self.history:
+                result.append((self.history[-1], "last_observed"))
+            else:
+                result.append((float(FALLBACK_RPS), "fallback"))
+        return result
+
+    def _quantile_offset(self, model: str, h: int, quantile: float) -> float:
+        """Distance from the model's point forecast to the requested quantile at horizon h."""
+        if quantile is None:
+            return 0.0
+        errors = self.errors[(model, h)]
+        if len(errors) >= MIN_INTERVAL_ERRORS:
+            return float(np.quantile(errors, quantile))
+        std = self.forecast_std.get(model, self.forecast_std.get("arima"))  # ARIMA's interval stands in for models without one
+        if std is not None:
+            return float(norm.ppf(quantile) * std[h - 1])
+        return 0.0
+
+    def data_age(self) -> float:
+        """Seconds since the newest observation (inf before the first one)."""
+        if self.last_timestamp is None:
+            return float("inf")
+        return (datetime.now(timezone.utc) - self.last_timestamp).total_seconds()
+
+    def describe(self) -> dict:
+        return {
+            f"h{h}": {"best": self.best_model(h), "mae": {m: round(e, 1) for m, e in self.mean_errors(h).items()}}
+            for h in range(1, self.horizon + 1)
+        }
+
+
+bank = ForecasterBank(make_rps_source())
+
 
 def get_rps_history():
-    # Current approach: Get last rps from /home/george/logs/traffic_generator/rps_schedule.jsonl
-    # Proper approach: Retrieves the historical RPS data with a query to Nginx Exporter (httptotalrequests)
-    rps_history = []
+    # Observations come from config.RPS_SOURCE: the traffic generator's schedule file, or
+    # request rates scraped from the nginx exporter / stub_status (see rps_source.py)
     try:
-        with open("/home/george/logs/traffic_generator/rps_schedule.jsonl", "r") as f:
-            for line in f:
-                entry = json.loads(line)
-                rps_history.append(entry["rps"])
+        bank.poll()
     except Exception as e:
         print(f"⚠️ Error reading RPS history: {e}")
-    return rps_history
+    return list(bank.history)
 
 
-
-# Global model object
-arima_model = None
-
-#Trains an ARIMA model on the historical RPS data.
+# Brings the forecaster bank up to date with the RPS source (fitting its models once enough data exists).
 def train_arima_model():
-    global arima_model
-    rps_history = get_rps_history()
+    get_rps_history()
+    if not bank.forecasts:
+        print("Not enough data to train the forecasters.")
 
-    if len(rps_history) < 10:
-        print("Not enough data to train ARIMA model.")
-        return
 
+# Waits for the next RPS observation (the controller's trigger). Returns how many arrived, 0 on timeout.
+def wait_for_new_rps(timeout: float) -> int:
     try:
-        # Check timestamp of the last entry
-        with open("/home/george/logs/traffic_generator/rps_schedule.jsonl", "r") as f:
-            last_line = list(f)[-1]
-            last_entry = json.loads(last_line)
-            last_time = datetime.fromisoformat(last_entry["timestamp"])
-            now = datetime.now(timezone.utc)
-            time_diff = (now - last_time).total_seconds()
-            #print(f"Last RPS entry was {time_diff:.2f} seconds ago.")
-            #print(f"Current time is {now.isoformat()} and last entry time is {last_time.isoformat()}.")
-
-            wait_time = 40-time_diff if time_diff < 40 else 0
-            print(f"⏳ Waiting {wait_time:.2f}s for fresh data...")
-            time.sleep(wait_time)
-
-        # Convert to NumPy array
-        rps_series = np.array(rps_history, dtype=np.float64)
-
-        # Train ARIMA
-        model = ARIMA(rps_series, order=(2, 1, 1))
-        arima_model = model.fit()
-        print(f"✅ ARIMA model trained at {datetime.now(timezone.utc).isoformat()}.")
-
+        return bank.wait_for_observation(timeout)
     except Exception as e:
-        print(f"❌ Failed to train ARIMA model: {e}")
+        print(f"⚠️ Error reading RPS history: {e}")
+        time.sleep(timeout)
+        return 0
+
+
+# Forecasts the next `steps` RPS values, each from the currently most accurate model for its horizon.
+# With a quantile (e.g. 0.9), returns that quantile of each forecast instead of the point forecast.
+def forecast_rps(steps: int = 1, quantile: float = None) -> list[int]:
+    forecasts = bank.forecast(steps, quantile)
+    if forecasts and forecasts[0][1] in ("last_observed", "fallback"):
+        print(f"⚠️ No forecaster available yet. Using the {forecasts[0][1].replace('_', ' ')} RPS.")
+    return [int(max(0, round(value))) for value, _ in forecasts]  # Ensure RPS is non-negative
 
 
-# Uses the trained ARIMA model to forecast the next RPS value.
+# Forecasts the next RPS value.
 def predict_next_rps():
-    global arima_model
-    if arima_model is None:
-        print("⚠️ ARIMA model not trained. Returning fallback value.")
-        return 1000
-    try:
-        forecast = arima_model.forecast(steps=1)
-        return int(max(0, round(forecast[0])))  # Ensure RPS is non-negative
-    except Exception as e:
-        print(f"❌ Prediction failed: {e}")
-        return 1000
+    return forecast_rps(1)[0]
 
 if __name__ == "__main__":
     # Example usage
     train_arima_model()
-    next_rps = predict_next_rps()
-    print(f"Predicted next RPS: {next_rps}")
-    
-    # Continuously predict every minute
+    print(f"Predicted next RPS: {forecast_rps(FORECAST_HORIZON)}, 90th percentile: {forecast_rps(FORECAST_HORIZON, 0.9)}")
+
+    # Predict whenever a new observation arrives
     while True:
-        time.sleep(60)  # Wait for 1 minute
-        next_rps = predict_next_rps()
-        print(f"Predicted next RPS: {next_rps}")
\ No newline at end of file
+        wait_for_new_rps(60)
+        print(f"Predicted next RPS: {forecast_rps(FORECAST_HORIZON)} {bank.describe()}")
@@ -1,12 +1,23 @@
 COOLDOWN_PERIOD = 3  # minutes between major actions
 SLO_THRESHOLD = 0.8  # Acceptable slowdown ratio
 MAX_REPLICAS = 4
-CHECK_INTERVAL_SEC = 60  # Check every minute
+CHECK_INTERVAL_SEC = 60  # The loop runs on each new RPS observation, or after this long without one
+RPS_SIZING_QUANTILE = 0.9  # Replica counts cover the RPS forecast up to this quantile (0.5 sizes for the median)
+SCALE_UP_LEAD_STEPS = 1  # Replicas are sized for the highest RPS forecast this many minutes ahead (at most arima.FORECAST_HORIZON)
+
+# RPS values of the prediction grid fetched alongside the forecast (covers the 500-rounded forecasts)
+GRID_RPS_VALUES = list(range(0, 6001, 500))
 
 CLUSTER_NODES = ['minikube', 'minikube-m02']
 
 PREDICTOR_API_URL = "http://localhost:5000"  # URL of the slowdown predictor API
 
+# Observed load for the RPS forecasters (see rps_source.py)
+RPS_SOURCE = "schedule"  # "schedule": traffic generator's planned rate, "nginx": request rate scraped from nginx
+RPS_SCHEDULE_PATH = "/home/george/logs/traffic_generator/rps_schedule.jsonl"
+NGINX_METRICS_URL = "http://localhost:9113/metrics"  # nginx-prometheus-exporter, or the stub_status page itself
+NGINX_REQUESTS_METRIC = "nginx_http_requests_total"
+
 PLACEMENT_METRIC = "avg"  # Options: "avg", "max"
 
 
@@ -4,15 +4,17 @@ import json
 from datetime import datetime, timezone
 import sys
 import os
-from config import CHECK_INTERVAL_SEC
-from arima import predict_next_rps, train_arima_model
-from predictor_client import get_slowdown_predictions
+from concurrent.futures import ThreadPoolExecutor
+from config import CHECK_INTERVAL_SEC, MAX_REPLICAS, GRID_RPS_VALUES, SCALE_UP_LEAD_STEPS, RPS_SIZING_QUANTILE
+from arima import forecast_rps, train_arima_model, wait_for_new_rps, bank
+from predictor_client import get_slowdown_predictions, get_prediction_grid, predictions_from_grid
 from placement_logic import choose_best_replica_plan, determine_replica_count_for_rps
 from k8s_interface import apply_replica_plan
 #from utils import log_decision
 
 logging.basicConfig(level=logging.INFO) # Logging setup
 last_applied_plan = None
+stage_pool = ThreadPoolExecutor(max_workers=2)  # Overlaps the Predictor call with forecasting
 
 def log_replica_plan(log_path, rps, replicas, plan):
     entry = {
@@ -28,25 +30,39 @@ def log_replica_plan(log_path, rps, replicas, plan):
 
 def marla_loop(log_path):
     last_applied_plan = {"minikube": 1,"minikube-m02": 1} # Initial state with 1 replica on each node
+    # 1. Train on the RPS history recorded so far; later observations update the model as they arrive
+    train_arima_model()
     while True:
+        # Triggered by each new RPS observation instead of a fixed one-minute sleep
+        arrived = wait_for_new_rps(CHECK_INTERVAL_SEC)
         start_time = time.time()
-        logging.info("Controller loop triggered.")
-        # 1. Ensure model is trained before predictions
-        train_arima_model()  
+        if arrived:
+            logging.info(f"Controller loop triggered by {arrived} new RPS observation(s).")
+        else:
+            logging.info(f"Controller loop triggered: no new RPS observation in {CHECK_INTERVAL_SEC}s.")
+
+        # The NP surface for every RPS on the grid does not depend on the forecast, so it is fetched meanwhile
+        grid_future = stage_pool.submit(get_prediction_grid, GRID_RPS_VALUES, MAX_REPLICAS)
 
         try:
-            # 2. Forecast next-minute RPS
-            forecasted_rps = predict_next_rps()
-            logging.info(f"Forecasted RPS: {forecasted_rps}")
+            # 2. Forecast the next minutes' RPS and size for the peak within the scale-up lead time
+            rps_horizon = forecast_rps(SCALE_UP_LEAD_STEPS)
+            forecasted_rps = max(rps_horizon)
+            upper_rps = max(forecast_rps(SCALE_UP_LEAD_STEPS, RPS_SIZING_QUANTILE))
+            logging.info(f"Forecasted RPS: {forecasted_rps}, p{RPS_SIZING_QUANTILE * 100:.0f}: {upper_rps} "
+                         f"(next {SCALE_UP_LEAD_STEPS} min: {rps_horizon}, models: {bank.describe()})")
             forecasted_rps_round200 = round(forecasted_rps / 200) * 200 # Round to nearest 200 for Lookup Table
+            upper_rps_round200 = round(upper_rps / 200) * 200
             forecasted_rps_round500 = round(forecasted_rps / 500) * 500 # Round to nearest 500 for slowdown predictions
 
-            # 3. Get number of replicas needed based on forecasted RPS, from the lookup table
-            replicas_needed = determine_replica_count_for_rps(forecasted_rps_round200)
+            # 3. Get number of replicas needed based on forecasted RPS, from the lookup table, covering up to the upper quantile
+            replicas_needed = determine_replica_count_for_rps(forecasted_rps_round200, upper_rps_round200)
             logging.info(f"Replicas needed based on forecasted RPS: {replicas_needed}")
 
             # 4. Get normalized_perfomance predictions for each combination of pods in the nodes. 
-            normalized_perfomance_predictions = get_slowdown_predictions(forecasted_rps_round500, replicas_needed)
+            normalized_perfomance_predictions = predictions_from_grid(grid_future.result(), forecasted_rps_round500, replicas_needed)
+            if not normalized_perfomance_predictions:
+                normalized_perfomance_predictions = get_slowdown_predictions(forecasted_rps_round500, replicas_needed)
             #logging.info(f"Slowdown predictions: {normalized_perfomance_predictions}")
 
             # 5. Choose optimal replica plan
@@ -68,9 +84,7 @@ def marla_loop(log_path):
         except Exception as e:
             logging.error(f"Controller error: {e}")
 
-        # Wait until next minute
-        elapsed = time.time() - start_time
-        time.sleep(max(0, CHECK_INTERVAL_SEC - elapsed))
+        logging.info(f"Decision took {time.time() - start_time:.2f}s, {bank.data_age():.2f}s after the RPS observation.")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
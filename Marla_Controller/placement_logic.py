@@ -78,8 +78,10 @@ def choose_best_replica_plan(np_predictions_raw: Dict[int, Dict[str, float]],rep
 ## This comes after RIMA model and replica count determination
 ## It is part of Scaling Subsystem
 
-# Get the number of replicas needed based on forecasted RPS from the replica_lookup.json file
-def determine_replica_count_for_rps(predicted_rps: int) -> int:
+# Get the number of replicas needed based on forecasted RPS from the replica_lookup.json file.
+# With upper_rps (an upper forecast quantile), returns the largest recommendation for any RPS
+# from predicted_rps up to upper_rps, so the plan also covers the upper end of the forecast.
+def determine_replica_count_for_rps(predicted_rps: int, upper_rps: int = None) -> int:
     try:
         with open("replica_lookup.json", "r") as f:
             lookup_table = json.load(f)
@@ -94,6 +96,11 @@ def determine_replica_count_for_rps(predicted_rps: int) -> int:
             else:
                 break
 
+        if upper_rps is not None:
+            in_range = [entry["Recommended_Replicas"] for entry in sorted_table if predicted_rps < entry["RPS"] <= upper_rps]
+            if in_range:
+                recommended = max(in_range + ([recommended] if recommended is not None else []))
+
         if recommended is not None:
             return recommended
         else:
@@ -118,5 +125,6 @@ if __name__ == "__main__":
     rps = 1700
     replicas_needed = determine_replica_count_for_rps(rps)
     print(f"Replicas needed for RPS {rps}: {replicas_needed}")
+    print(f"Replicas needed for RPS {rps}, up to 2100 at the upper quantile: {determine_replica_count_for_rps(rps, 2100)}")
 
 
@@ -18,6 +18,36 @@ def get_slowdown_predictions(forecasted_rps: int, replicas_needed: list[int]) ->
     except requests.exceptions.RequestException as e:
         logging.error(f"Error contacting slowdown predictor API: {e}")
         return {}  # Fallback: empty dict (no predictions)
+
+
+# Query the predictor for the whole RPS x replicas surface in one call.
+def get_prediction_grid(rps_values: list[int], max_replicas: int) -> dict:
+    try:
+        payload = {
+            "rps": rps_values,
+            "max_replicas": max_replicas
+        }
+
+        response = requests.post(f"{PREDICTOR_API_URL}/predict_grid", json=payload, timeout=5)
+        response.raise_for_status()
+
+        return response.json()
+
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error contacting slowdown predictor API: {e}")
+        return {}  # Fallback: empty dict (no predictions)
+
+
+# Slices the grid row of one RPS value into /predict's format, for replica counts 1..replicas_needed.
+def predictions_from_grid(grid: dict, rps: int, replicas_needed: int) -> dict:
+    if not grid or rps not in grid.get("rps", []):
+        return {}  # Not covered by the grid: the caller falls back to /predict
+    row = grid["rps"].index(rps)
+    return {
+        str(rep_count): {node: surface[row][r] for node, surface in grid["predictions"].items()}
+        for r, rep_count in enumerate(grid["replicas"]) if rep_count <= replicas_needed
+    }
+
 """
 NOTES
     
@@ -28,4 +58,11 @@ Returns:
         2: {'node1': 0.55, 'node2': 0.75},
         ...
     }
-"""
\ No newline at end of file
+
+get_prediction_grid returns:
+    {
+        'rps': [1000, 1500, ...],
+        'replicas': [1, 2, 3, 4],
+        'predictions': {'node1': [[NP per replica count] per RPS], 'node2': ...}
+    }
+"""
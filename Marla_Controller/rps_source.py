@@ -0,0 +1,220 @@
+"""
+Sources of observed RPS for the forecasters in arima.py.
+
+A source's read() returns the (timestamp, rps) observations that arrived
+since the previous call, one per minute, and sets `restarted` when the
+history before them no longer applies.
+
+    ScheduleFileSource: the traffic generator's rps_schedule.jsonl (the planned rate)
+    NginxRateSource:    request rates scraped from the nginx Prometheus exporter or
+                        the stub_status page, downsampled to one value per minute
+
+Run `python3 rps_source.py` for a demo of the scraper against a local stand-in exporter.
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from config import RPS_SOURCE, RPS_SCHEDULE_PATH, NGINX_METRICS_URL, NGINX_REQUESTS_METRIC
+
+SCRAPE_INTERVAL_SEC = 1  # Counter scrapes, i.e. resolution of the raw per-second rate series
+DOWNSAMPLE_SEC = 60  # One observation per minute, the forecasters' step
+SCRAPE_TIMEOUT_SEC = 2
+
+
+class JsonlTail:
+    """
+    Reads a JSONL file incrementally: each read() parses only the lines appended
+    since the previous one (tracked by byte offset). A partially written last
+    line is left for the next read; a truncated or replaced file is re-read from
+    the start, with `restarted` set for that read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.restarted = False
+
+    def read(self) -> list[dict]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        self.restarted = self.inode is not None and (stat.st_ino != self.inode or stat.st_size < self.offset)
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode, self.offset = stat.st_ino, 0
+        if stat.st_size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        complete = chunk.rfind(b"\n") + 1
+        self.offset += complete
+        entries = []
+        for line in chunk[:complete].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print(f"⚠️ Skipping malformed RPS entry: {line[:80]!r}")
+        return entries
+
+
+class ScheduleFileSource:
+    """Observations from the traffic generator's schedule file: {"timestamp", "minute", "rps"} per line."""
+
+    def __init__(self, path: str = RPS_SCHEDULE_PATH):
+        self.tail = JsonlTail(path)
+        self.restarted = False
+
+    def read(self) -> list[tuple[datetime, float]]:
+        entries = self.tail.read()
+        self.restarted = self.tail.restarted
+        return [(datetime.fromisoformat(entry["timestamp"]), float(entry["rps"])) for entry in entries]
+
+
+def parse_request_counter(text: str, metric: str = NGINX_REQUESTS_METRIC) -> float:
+    """
+    Total handled requests from an nginx stub_status page or a Prometheus
+    exposition (the counter summed over its label sets).
+    """
+    if text.lstrip().startswith("Active connections"):
+        # Active connections: 2
+        # server accepts handled requests
+        #  16630948 16630948 31070465
+        return float(text.strip().splitlines()[2].split()[2])
+    pattern = re.compile(rf"^{re.escape(metric)}(?:{{[^}}]*}})?\s+(\S+)", re.MULTILINE)
+    values = pattern.findall(text)
+    if not values:
+        raise ValueError(f"{metric} not found in the scraped metrics")
+    return sum(float(v) for v in values)
+
+
+class NginxRateSource:
+    """
+    Observed RPS from nginx's request counter.
+
+    A background thread scrapes the counter every SCRAPE_INTERVAL_SEC and
+    turns consecutive readings into per-second rates. The rates are averaged
+    over wall-clock DOWNSAMPLE_SEC buckets; read() returns the buckets
+    completed since the previous call, stamped with their end time. A counter
+    reset (nginx restart) only drops the interval it happened in. Buckets
+    without any scrape are skipped.
+    """
+
+    def __init__(self, url: str = NGINX_METRICS_URL, metric: str = NGINX_REQUESTS_METRIC,
+                 interval: float = SCRAPE_INTERVAL_SEC, bucket: float = DOWNSAMPLE_SEC):
+        self.url = url
+        self.metric = metric
+        self.interval = interval
+        self.bucket = bucket
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.last_rate = None  # (time, requests/s) of the latest scrape interval
+        self.completed = []  # Downsampled (end time, rps) not yet read
+        self.current_bucket = None
+        self.bucket_rates = []
+        self.last_reading = None  # (time, counter)
+        self.scrapes = 0
+        self.errors = 0
+        self.last_error = None
+        self.restarted = False
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            started = time.time()
+            try:
+                response = self.session.get(self.url, timeout=SCRAPE_TIMEOUT_SEC)
+                response.raise_for_status()
+                self.record(time.time(), parse_request_counter(response.text, self.metric))
+            except Exception as e:
+                self.errors += 1
+                if str(e) != self.last_error:
+                    print(f"⚠️ RPS scrape of {self.url} failed: {e}")
+                self.last_error = str(e)
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def record(self, now: float, counter: float):
+        """Adds one counter reading taken at `now` (epoch seconds)."""
+        with self.lock:
+            self.scrapes += 1
+            previous, self.last_reading = self.last_reading, (now, counter)
+            if previous is None or now <= previous[0] or counter < previous[1]:
+                return  # First reading, clock step or counter reset: no rate for this interval
+            rate = (counter - previous[1]) / (now - previous[0])
+            self.last_rate = (now, rate)
+            bucket = int(now // self.bucket)
+            if bucket != self.current_bucket:
+                self._close_bucket()
+                self.current_bucket = bucket
+            self.bucket_rates.append(rate)
+
+    def _close_bucket(self):
+        if self.current_bucket is not None and self.bucket_rates:
+            end = datetime.fromtimestamp((self.current_bucket + 1) * self.bucket, timezone.utc)
+            self.completed.append((end, sum(self.bucket_rates) / len(self.bucket_rates)))
+        self.bucket_rates = []
+
+    def read(self) -> list[tuple[datetime, float]]:
+        with self.lock:
+            if self.current_bucket is not None and time.time() >= (self.current_bucket + 1) * self.bucket:
+                self._close_bucket()  # No scrape arrived after the bucket ended (e.g. exporter down)
+                self.current_bucket = None
+            completed, self.completed = self.completed, []
+        return completed
+
+    def stats(self) -> dict:
+        return {"url": self.url, "scrapes": self.scrapes, "errors": self.errors, "last_error": self.last_error,
+                "last_rate": self.last_rate}
+
+
+def make_rps_source(kind: str = RPS_SOURCE):
+    """The RPS source selected by config.RPS_SOURCE ("schedule" or "nginx")."""
+    if kind == "schedule":
+        return ScheduleFileSource()
+    if kind == "nginx":
+        return NginxRateSource().start()
+    raise ValueError(f"Unknown RPS source {kind}")
+
+
+if __name__ == "__main__":
+    # Demo: scrape a local stand-in for the nginx exporter serving a counter that grows at ~500 RPS
+    # then ~1500 RPS, downsampled to 5 s buckets.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    served = {"requests": 0.0, "time": time.time()}
+
+    class StandInExporter(BaseHTTPRequestHandler):
+        def do_GET(self):
+            now = time.time()
+            rate = 500 if now - demo_start < 10 else 1500
+            served["requests"] += rate * (now - served["time"])
+            served["time"] = now
+            body = (f"# TYPE {NGINX_REQUESTS_METRIC} counter\n"
+                    f"{NGINX_REQUESTS_METRIC} {int(served['requests'])}\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    demo_start = time.time()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInExporter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    source = NginxRateSource(url=f"http://127.0.0.1:{server.server_port}/metrics", interval=0.5, bucket=5).start()
+    for _ in range(5):
+        time.sleep(5)
+        for end, rps in source.read():
+            print(f"{end.isoformat()}  {rps:.0f} RPS")
+    print(source.stats())